@@ -0,0 +1,271 @@
+"""
+Headless benchmarks for the widget hot paths.  Runs without a display (the
+SDL dummy video driver is used unless SDL_VIDEODRIVER is already set) and
+prints results as JSON so that runs can be compared.
+
+Usage: python benchmark.py [--quick] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+
+from guipack import events, movewindow, scrollwindow, search
+from guipack.packedcontent import PackedContent
+from guipack.subrect import Subrect
+from guipack.windowmanager import WindowManager
+
+
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+
+
+class Bench(object):
+    def __init__(self, min_time, eager_max):
+        """Each benchmark is repeated until it has run for at least min_time
+        seconds.  Non-virtual ScrollWindows are only built for content sizes
+        up to eager_max."""
+        self.min_time = min_time
+        self.eager_max = eager_max
+        self.results = []
+        self.screen = pg.display.get_surface()
+        self.font = pg.font.Font(None, 18)
+
+    def time(self, name, func, setup=None, frame=False, **params):
+        """Time calls to func (after calling setup once, if given) and record
+        the result.  If frame is true, frames per second are reported too."""
+        if setup:
+            setup()
+        calls = 0
+        elapsed = 0.0
+        batch = 1
+        while elapsed < self.min_time:
+            start = timeit.default_timer()
+            for _ in range(batch):
+                func()
+            elapsed += timeit.default_timer()-start
+            calls += batch
+            batch *= 2
+        result = {"name": name, "params": params, "calls": calls,
+                  "us_per_call": elapsed/calls*1e6}
+        if frame:
+            result["fps"] = calls/elapsed
+        self.results.append(result)
+        sys.stderr.write("{:<28} {:<32} {:>12.2f} us\n".format(name,
+                         json.dumps(params), result["us_per_call"]))
+
+    def make_window(self, content, **kwargs):
+        win = movewindow.MoveWindow(Subrect((50, 50, 200, 300)),
+                                    text="Bench", font=self.font)
+        bar_subrect = Subrect((25, 45, 150, 230), win.subrect)
+        win.content.append(scrollwindow.ScrollWindow(bar_subrect, content,
+                                                     self.font, **kwargs))
+        return win
+
+    def bench_construction(self, sizes):
+        self.time("movewindow_construct", lambda: movewindow.MoveWindow(
+                  Subrect((50, 50, 200, 300)), text="Bench", font=self.font))
+        for size in sizes:
+            content = gen_content(size)
+            for virtual in (False, True):
+                if not virtual and size > self.eager_max:
+                    continue
+                self.time("scrollwindow_construct",
+                          lambda: scrollwindow.ScrollWindow(
+                              Subrect((0, 0, 150, 230)), content, self.font,
+                              virtual=virtual),
+                          size=size, virtual=virtual)
+            packed = PackedContent(content)
+            self.time("scrollwindow_construct_packed",
+                      lambda: scrollwindow.ScrollWindow(
+                          Subrect((0, 0, 150, 230)), packed, self.font,
+                          virtual=True),
+                      size=size)
+            def threaded():
+                scrollwindow.ScrollWindow(
+                    Subrect((0, 0, 150, 230)), content, self.font,
+                    render_threads=2,
+                    font_factory=lambda: pg.font.Font(None, 18)).close()
+            self.time("scrollwindow_construct_threaded", threaded, size=size)
+
+    def bench_frames(self, sizes):
+        for size in sizes:
+            content = gen_content(size)
+            win = self.make_window(content, virtual=True)
+            scroll = win.content[0]
+            self.time("frame_idle", lambda: win.update(self.screen),
+                      frame=True, size=size)
+            step = [1]
+            def drag():
+                if not self.screen.get_rect().contains(
+                        win.subrect.move(step[0], step[0])):
+                    step[0] = -step[0]
+                win.subrect.move_ip(step[0], step[0])
+                win.update(self.screen)
+            self.time("frame_drag", drag, frame=True, size=size)
+            wheel = [5]
+            def scroll_frame():
+                if scroll.index in (0, scroll.last_index()):
+                    wheel[0] = 9-wheel[0]
+                event = pg.event.Event(pg.MOUSEBUTTONDOWN, button=wheel[0],
+                                       pos=scroll.subrect.rel2display().center)
+                win.get_events(event)
+                win.update(self.screen)
+            self.time("frame_scroll", scroll_frame, frame=True, size=size)
+
+    def bench_events(self):
+        win = self.make_window(gen_content(1000))
+        manager = WindowManager()
+        for i in range(50):
+            other = self.make_window(gen_content(100))
+            other.subrect.topleft = ((i*37)%500, (i*53)%300)
+            manager.add(other)
+        stream = gen_events(1000, self.screen.get_rect())
+        for name, target in (("events_movewindow", win),
+                             ("events_manager_50", manager)):
+            def dispatch():
+                for event in stream:
+                    target.get_events(event)
+            self.time(name, dispatch, events=len(stream))
+        def coalesced():
+            for event in events.coalesce(stream):
+                manager.get_events(event)
+        self.time("events_manager_50_coalesced", coalesced,
+                  events=len(stream))
+
+    def bench_filter(self, sizes):
+        """Type a query one key at a time into a type-ahead filter."""
+        for size in sizes:
+            content = gen_content(size)
+            for mode, query in (("prefix", "item number 1"),
+                                ("substring", "number 12")):
+                scroll = scrollwindow.ScrollWindow(
+                    Subrect((0, 0, 150, 230)), content, self.font,
+                    virtual=True, search=mode)
+                self.time("search_index_build",
+                          lambda: search.SearchIndex(content, mode).build(),
+                          size=size, mode=mode)
+                def type_query():
+                    scroll.filter("")
+                    for end in range(1, len(query)+1):
+                        scroll.filter(query[:end])
+                self.time("filter_typed", type_query,
+                          setup=lambda: scroll.get_search_index().build(),
+                          size=size, mode=mode, keys=len(query))
+
+    def make_nested(self, depth):
+        """A window with a nested window and a scroll window inside it, depth
+        levels deep.  Returns the outer window and the innermost scroll
+        window."""
+        root = parent = movewindow.MoveWindow(Subrect((10, 10, 600, 560)),
+                                              text="Bench", font=self.font)
+        for _ in range(depth):
+            rect = parent.subrect
+            child = movewindow.MoveWindow(
+                Subrect((4, 26, rect.width-8, rect.height-30), rect),
+                text="Bench", font=self.font)
+            scroll = scrollwindow.ScrollWindow(
+                Subrect((rect.width-90, 30, 80, 60), rect),
+                gen_content(100), self.font, virtual=True)
+            parent.content.extend([child, scroll])
+            parent = child
+        return root, scroll
+
+    def bench_nested(self):
+        """Frames of a nested, mostly static window tree.  Only the damaged
+        parts of the tree should be updated and recomposited.  As in the
+        compositor's update pass, the final blit to the screen is clipped
+        away."""
+        self.screen.set_clip((0, 0, 0, 0))
+        for depth in (1, 4, 16):
+            root, scroll = self.make_nested(depth)
+            root.update(self.screen)
+            self.time("frame_idle_nested", lambda: root.update(self.screen),
+                      frame=True, depth=depth)
+            rect = scroll.subrect.rel2display()
+            step = [0]
+            def hover():
+                step[0] = (step[0]+7)%rect.height
+                pos = (rect.x+20, rect.y+step[0])
+                root.get_events(pg.event.Event(pg.MOUSEMOTION, pos=pos,
+                                               rel=(0, 7), buttons=(0, 0, 0)))
+                root.update(self.screen)
+            self.time("frame_hover_nested", hover, frame=True, depth=depth)
+        self.screen.set_clip(None)
+
+    def bench_subrect(self):
+        for depth in (1, 4, 16, 64):
+            rect = root = Subrect((1, 1, 10, 10))
+            for _ in range(depth-1):
+                rect = Subrect((1, 1, 10, 10), rect)
+            self.time("rel2display", rect.rel2display, depth=depth)
+            def moved():
+                root.move_ip(0, 0)
+                rect.rel2display()
+            self.time("rel2display_after_move", moved, depth=depth)
+
+    def run(self, sizes):
+        self.bench_construction(sizes)
+        self.bench_frames(sizes)
+        self.bench_nested()
+        self.bench_events()
+        self.bench_filter(sizes)
+        self.bench_subrect()
+        return {"meta": {"python": platform.python_version(),
+                         "pygame": pg.version.ver,
+                         "platform": platform.platform(),
+                         "video_driver": os.environ["SDL_VIDEODRIVER"]},
+                "results": self.results}
+
+
+def gen_content(size):
+    """Content strings of varied lengths."""
+    return ["Item number {} {}".format(i, "x"*(i%17)) for i in range(size)]
+
+
+def gen_events(count, bounds):
+    """A repeatable stream of mouse motion, wheel and click events."""
+    events = []
+    for i in range(count):
+        pos = ((i*97)%bounds.width, (i*61)%bounds.height)
+        if i%10 == 0:
+            events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, pos=pos,
+                                         button=(1, 4, 5)[i%3]))
+        elif i%10 == 1:
+            events.append(pg.event.Event(pg.MOUSEBUTTONUP, pos=pos, button=1))
+        else:
+            events.append(pg.event.Event(pg.MOUSEMOTION, pos=pos, rel=(1, 1),
+                                         buttons=(0, 0, 0)))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="shorter runs and content sizes up to 10000")
+    parser.add_argument("--min-time", type=float, default=None,
+                        help="minimum seconds spent on each benchmark")
+    parser.add_argument("--eager-max", type=int, default=100000,
+                        help="largest content size built without virtual mode")
+    parser.add_argument("--output", help="write the JSON results to a file")
+    args = parser.parse_args()
+    pg.init()
+    pg.display.set_mode((700, 600))
+    sizes = [size for size in SIZES if size <= 10000] if args.quick else SIZES
+    min_time = args.min_time or (0.05 if args.quick else 0.5)
+    results = Bench(min_time, args.eager_max).run(sizes)
+    if args.output:
+        with open(args.output, "w") as myfile:
+            json.dump(results, myfile, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Headless check of damage tracking.  A scripted session (hovering, scrolling,
+dragging, editing, filtering and adding or removing content) is played against windows at several
+offsets, some nested, and after every step the composited screen is compared
+with a full redraw of all of the windows.  Any step that differs is printed
+and the exit status is nonzero.
+
+Usage: python damage_check.py
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+
+from guipack import movewindow, scrollwindow
+from guipack.compositor import Compositor
+from guipack.subrect import Subrect
+from guipack.windowmanager import WindowManager
+
+
+WINDOWS = [((0, 0), False, {}),
+           ((50, 50), True, {}),
+           ((400, 150), False, {}),
+           ((230, 290), True, {}),
+           ((480, 10), False, {"smooth": True, "highlight": False})]
+BACKGROUND = (25, 155, 255)
+
+
+class Session(object):
+    def __init__(self, screen, font):
+        """The WINDOWS (offset, whether the scroll window is in a nested
+        window, and scroll window keywords)."""
+        self.screen = screen
+        self.font = font
+        self.mouse = (0, 0)
+        self.windows = []
+        self.scrolls = []
+        self.manager = WindowManager()
+        for offset, nested, kwargs in WINDOWS:
+            self.manager.add(self.make_window(offset, nested, **kwargs))
+        self.compositor = Compositor(screen, BACKGROUND)
+        self.compositor.add(self.manager)
+        self.mismatches = []
+
+    def make_window(self, offset, nested, **kwargs):
+        win = movewindow.MoveWindow(Subrect(offset+(200, 300)),
+                                    text="Window", font=self.font)
+        self.windows.append(win)
+        content = ["Row {} of {}".format(i, offset) for i in range(60)]
+        if nested:
+            inner = movewindow.MoveWindow(Subrect((10, 35, 180, 250),
+                                                  win.subrect),
+                                          text="Inner", font=self.font)
+            self.windows.append(inner)
+            win.content.append(inner)
+            win = inner
+        scroll = scrollwindow.ScrollWindow(Subrect((10, 35, 150, 180),
+                                                   win.subrect),
+                                           content, self.font, **kwargs)
+        win.content.append(scroll)
+        self.scrolls.append(scroll)
+        return self.windows[-2] if nested else win
+
+    def send(self, kind, **attributes):
+        if "pos" in attributes:
+            self.mouse = attributes["pos"]
+        self.manager.get_events(pg.event.Event(kind, **attributes))
+
+    def move(self, pos, buttons=(0, 0, 0)):
+        rel = (pos[0]-self.mouse[0], pos[1]-self.mouse[1])
+        self.send(pg.MOUSEMOTION, pos=pos, rel=rel, buttons=buttons)
+
+    def check(self, name):
+        """Compare a normal frame with a full redraw of the same state.  The
+        redraw mustn't move the state on, so momentum is paused for it."""
+        pg.display.update(self.compositor.update())
+        drawn = pg.image.tobytes(self.screen, "RGB")
+        for win in self.windows:
+            win.invalidate()
+        velocities = [scroll.velocity for scroll in self.scrolls]
+        for scroll in self.scrolls:
+            scroll.dirty = True
+            scroll.velocity = 0
+        self.screen.fill((0, 0, 0))
+        self.compositor.invalidate()
+        self.compositor.update()
+        for scroll, velocity in zip(self.scrolls, velocities):
+            scroll.velocity = velocity
+        if pg.image.tobytes(self.screen, "RGB") != drawn:
+            self.mismatches.append(name)
+            sys.stderr.write("mismatch: {}\n".format(name))
+
+    def run(self):
+        self.check("start")
+        for n, scroll in enumerate(self.scrolls):
+            rect = scroll.subrect.rel2display()
+            self.move(rect.move(5, 5).topleft)
+            for step in range(3):
+                self.move((rect.x+40, rect.y+10+step*25))
+                self.check("hover {} {}".format(n, step))
+            for button in (5, 5, 4):
+                self.send(pg.MOUSEBUTTONDOWN, pos=self.mouse, button=button)
+                self.check("wheel {} {}".format(n, button))
+            start = scroll.scroll_position()
+            self.send(pg.MOUSEBUTTONDOWN, pos=self.mouse, button=5)
+            for step in range(30):
+                self.check("coast {} {}".format(n, step))
+            if scroll.kwargs["smooth"] and scroll.scroll_position() == start:
+                self.mismatches.append("momentum {}".format(n))
+                sys.stderr.write("momentum not applied: {}\n".format(n))
+            scroll.extend(["Added row"]*3)
+            self.check("extend {}".format(n))
+            scroll.filter("row 1")
+            self.check("filter {}".format(n))
+            scroll.filter("")
+            self.check("unfilter {}".format(n))
+        for n, win in enumerate(self.windows):
+            handle = win.handle_rect.rel2display()
+            self.move((handle.x+30, handle.y+5))
+            self.send(pg.MOUSEBUTTONDOWN, pos=self.mouse, button=1)
+            self.check("press handle {}".format(n))
+            for step in range(4):
+                self.move((self.mouse[0]+5, self.mouse[1]+3), (1, 0, 0))
+                self.check("drag {} {}".format(n, step))
+            self.send(pg.MOUSEBUTTONUP, pos=self.mouse, button=1)
+            self.check("release {}".format(n))
+        self.check_replaced()
+        self.check_rendered()
+        return self.mismatches
+
+    def check_replaced(self):
+        """Content appended to or removed from a window that has already been
+        drawn (top level and nested) must appear and disappear without the
+        window being invalidated.  The content is created a frame early so
+        the damage it reports on creation doesn't hide the append."""
+        for n, win in enumerate(self.windows[:3]):
+            scroll = scrollwindow.ScrollWindow(Subrect((20, 230, 120, 50),
+                                                       win.subrect),
+                                               ["Late row"]*5, self.font)
+            self.check("create {}".format(n))
+            win.content.append(scroll)
+            for step in range(3):
+                self.check("append {} {}".format(n, step))
+            win.content.remove(scroll)
+            for step in range(3):
+                self.check("remove {} {}".format(n, step))
+
+    def check_rendered(self):
+        """Rows rendered by a worker thread must all arrive, including the
+        last one, which is still being rendered when nothing is left to
+        claim."""
+        def slow_row(item, color):
+            time.sleep(0.02)
+            row = pg.Surface((100, 12))
+            row.fill(color)
+            return row
+        win = self.make_window((300, 200), False, render_threads=1,
+                               row_renderer=slow_row,
+                               font_factory=lambda: None)
+        self.manager.add(win)
+        scroll = self.scrolls[-1]
+        scroll.set_items(["Slow row {}".format(i) for i in range(5)])
+        for _ in range(300):
+            pg.display.update(self.compositor.update())
+            time.sleep(0.002)
+        if None in scroll.rendered:
+            self.mismatches.append("rendered rows")
+            sys.stderr.write("rows never drawn: {}\n".format(
+                             scroll.rendered.count(None)))
+        self.check("rendered rows")
+        scroll.close()
+
+
+def main():
+    pg.init()
+    screen = pg.display.set_mode((700, 600))
+    font = pg.font.Font(None, 18)
+    mismatches = Session(screen, font).run()
+    pg.quit()
+    print("{} mismatched steps".format(len(mismatches)))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
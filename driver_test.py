@@ -1,6 +1,7 @@
 """
 This file illustrates an example usage of the MoveWindow, ScrollWindow,
-and Subrect classes.
+and Subrect classes.  Typing filters the scroll window and Escape clears the
+filter; close the display window to quit.
 
 -Written by Sean McKiernan
 """
@@ -9,7 +10,10 @@ import os
 import sys
 import pygame as pg
 
-from guipack import scrollwindow, movewindow
+from guipack import diskcache, events, scrollwindow, movewindow
+from guipack.compositor import Compositor
+from guipack.profiler import PROFILER, FileExporter, ProfilerOverlay
+from guipack.windowmanager import WindowManager
 from guipack.subrect import Subrect
 
 
@@ -19,27 +23,44 @@ class Control(object):
         self.done = False
         self.clock = pg.time.Clock()
         self.fps = 60
-        self.win = self.make_win()
+        self.win = self.make_win((50,50,200,300), "Fruits and Vegetables",
+                                 gen_content())
+        self.other = self.make_win((400,150,200,300), "Backwards",
+                                   gen_content()[::-1])
+        self.manager = WindowManager()
+        self.manager.add(self.win)
+        self.manager.add(self.other)
+        self.compositor = Compositor(self.screen, (25, 155, 255))
+        self.compositor.add(self.manager)
+        if "--profile" in sys.argv:
+            self.setup_profiling()
 
-    def make_win(self):
+    def setup_profiling(self):
+        """Log frame statistics to a file and show them on screen."""
+        PROFILER.enable()
+        PROFILER.add_exporter(FileExporter("profile.jsonl"))
+        overlay = ProfilerOverlay(Subrect((440,460,260,140)), FONT)
+        self.compositor.add(overlay)
+
+    def make_win(self, rect, text, content):
         """Setup a movable window that contains a scroll window."""
-        window_args = {"text"       : "Fruits and Vegetables",
+        window_args = {"text"       : text,
                        "font"       : FONT,
                        "text_color" : (255,255,255)}
-        win = movewindow.MoveWindow(Subrect((50,50,200,300)),**window_args)
-##        win = movewindow.MoveWindow(Subrect((50,50,200,300)),background=FRAC,
+        win = movewindow.MoveWindow(Subrect(rect),**window_args)
+##        win = movewindow.MoveWindow(Subrect(rect),background=FRAC,
 ##                                    **window_args)
         bar_subrect = Subrect((25,45,150,230),win.subrect)
-        bar = scrollwindow.ScrollWindow(bar_subrect, gen_content(), FONT)
+        bar = scrollwindow.ScrollWindow(bar_subrect, content, FONT,
+                                        type_ahead="filter")
         win.content.append(bar)
         return win
 
     def event_loop(self):
-        for event in pg.event.get():
-            keys = pg.key.get_pressed()
-            if event.type == pg.QUIT or keys[pg.K_ESCAPE]:
+        for event in events.get():
+            if event.type == pg.QUIT:
                 self.done = True
-            get = self.win.get_events(event)
+            get = self.manager.get_events(event)
             if get:
                 print(get) ##Just printing for example purposes
                 pg.event.clear()
@@ -47,10 +68,10 @@ class Control(object):
 
     def main_loop(self):
         while not self.done:
+            PROFILER.begin_frame()
             self.event_loop()
-            self.screen.fill((25, 155, 255))
-            self.win.update(self.screen)
-            pg.display.update()
+            pg.display.update(self.compositor.update())
+            PROFILER.end_frame()
             self.clock.tick(self.fps)
 
 
@@ -67,6 +88,8 @@ if __name__ == "__main__":
     pg.display.set_mode((700, 600))
     FONT = pg.font.SysFont("timesnewroman", 15)
     FRAC = pg.image.load("frac.jpg").convert()
+    if "--disk-cache" in sys.argv:
+        diskcache.enable(".guicache")
     run_it = Control()
     run_it.main_loop()
     pg.quit()
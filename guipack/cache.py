@@ -0,0 +1,65 @@
+"""
+A simple least recently used cache used by the widgets to keep a bounded
+number of prerendered surfaces around.
+"""
+
+from collections import OrderedDict
+
+
+def surface_bytes(surface):
+    """Approximate memory used by the pixels of a surface."""
+    return surface.get_pitch()*surface.get_height()
+
+
+class LRUCache(object):
+    def __init__(self,max_items=None,max_bytes=None,sizeof=surface_bytes):
+        """Hold at most max_items values and/or at most max_bytes worth of
+        values as measured by sizeof.  The least recently used values are
+        discarded when either limit is exceeded."""
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def get(self,key,default=None):
+        """Return the value for key (marking it as recently used) or default
+        if it is not cached."""
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            return default
+        self.items[key] = value
+        return value
+
+    def __setitem__(self,key,value):
+        self.pop(key)
+        self.items[key] = value
+        if self.max_bytes is not None:
+            self.sizes[key] = self.sizeof(value)
+            self.total_bytes += self.sizes[key]
+        while len(self.items) > 1 and self.over_budget():
+            self.pop(next(iter(self.items)))
+
+    def over_budget(self):
+        if self.max_items is not None and len(self.items) > self.max_items:
+            return True
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            return True
+        return False
+
+    def __contains__(self,key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def pop(self,key,default=None):
+        self.total_bytes -= self.sizes.pop(key,0)
+        return self.items.pop(key,default)
+
+    def clear(self):
+        self.items.clear()
+        self.sizes.clear()
+        self.total_bytes = 0
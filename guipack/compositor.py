@@ -0,0 +1,78 @@
+"""
+A small helper that keeps track of which parts of the screen changed so
+that only those areas need to be passed to pg.display.update.
+"""
+
+import pygame as pg
+
+from .profiler import count, timed
+
+
+def merge_rects(rects,bounds):
+    """Clip rects to bounds and merge any that overlap.  Empty rects are
+    discarded."""
+    merged = []
+    for rect in rects:
+        rect = pg.Rect(rect).clip(bounds)
+        if not (rect.width and rect.height):
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class Compositor(object):
+    def __init__(self,surface,background):
+        """Manage drawing of widgets onto surface (generally the display).
+        Background may be either a surface the size of the target or a
+        color."""
+        self.surface = surface
+        if isinstance(background,pg.Surface):
+            self.background = background
+        else:
+            self.background = pg.Surface(surface.get_size()).convert()
+            self.background.fill(background)
+        self.widgets = []
+        self.full_redraw = True
+
+    def add(self,widget):
+        """Widgets are drawn in the order they were added.  A widget must have
+        an update method that returns changed screen rects and a draw method
+        that blits its current image."""
+        self.widgets.append(widget)
+        self.full_redraw = True
+
+    def remove(self,widget):
+        self.widgets.remove(widget)
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Redraw the entire surface on the next update."""
+        self.full_redraw = True
+
+    @timed("compositor.update")
+    def update(self):
+        """Update all widgets, restore the background under the areas that
+        changed, and redraw the widgets clipped to those areas.  The returned
+        list of rects can be passed directly to pg.display.update."""
+        bounds = self.surface.get_rect()
+        rects = []
+        self.surface.set_clip((0,0,0,0)) #Widgets draw in the second pass.
+        for widget in self.widgets:
+            rects.extend(widget.update(self.surface) or [])
+        self.surface.set_clip(None)
+        if self.full_redraw:
+            rects = [bounds]
+            self.full_redraw = False
+        rects = merge_rects(rects,bounds)
+        count("dirty_rects",len(rects))
+        for rect in rects:
+            self.surface.set_clip(rect)
+            self.surface.blit(self.background,rect,rect)
+            for widget in self.widgets:
+                widget.draw(self.surface)
+        self.surface.set_clip(None)
+        return rects
@@ -0,0 +1,268 @@
+"""
+An optional persistent cache of rendered surfaces, so that text and scaled
+skin images rendered by one run of an application can be reused by the next.
+Enable it once at startup (after pygame.init):
+    diskcache.enable("cache_directory")
+The text and skin caches then look surfaces up on disk before rendering them
+and add anything they render.  New surfaces are written out by flush, which
+enable registers to run at exit.
+
+Keys are made only of values that are the same from run to run: surfaces in
+a key are replaced by a hash of their pixels and fonts by a fingerprint of
+their metrics and rendering.  Pixels are stored raw in one data file that is
+memory-mapped and wrapped with pygame.image.frombuffer, so loading a surface
+doesn't copy or decode it.  The index is JSON (not pickle), so a cache
+directory that others can write to can't make the application run code.
+"""
+
+import os
+import sys
+import mmap
+import json
+import atexit
+import hashlib
+import pygame as pg
+
+
+VERSION = 2
+FORMS = ("BGRA","RGBX")
+FINGERPRINT_SAMPLE = u"AaBbGgJjQqWwYy@0123456789"
+DISK = None
+
+_fingerprints = {}
+
+
+def enable(directory,max_bytes=256*1024*1024):
+    """Use a disk cache in directory for the rest of the run."""
+    global DISK
+    disable()
+    DISK = DiskCache(directory,max_bytes)
+    atexit.register(DISK.flush)
+    return DISK
+
+
+def disable():
+    """Write out and stop using the current disk cache (if any)."""
+    global DISK
+    if DISK:
+        DISK.flush()
+    DISK = None
+
+
+def cached(key,build):
+    """Return build() through the disk cache if one is enabled.  The key
+    must already be stable (see stable_key)."""
+    if DISK is None:
+        return build()
+    return DISK.get_or_build(key,build)
+
+
+def pixel_hash(image):
+    """The size of an image and a hash of its pixels."""
+    digest = hashlib.sha1(pg.image.tobytes(image,"RGBA"))
+    return (image.get_size(),digest.hexdigest())
+
+
+def image_fingerprint(image):
+    """A hash of an image's size and pixels (computed once per image)."""
+    if image not in _fingerprints:
+        _fingerprints[image] = pixel_hash(image)
+    return _fingerprints[image]
+
+
+def font_fingerprint(font):
+    """Identify a font by its metrics, style and a hash of a rendered sample
+    (computed once per font object)."""
+    if font not in _fingerprints:
+        sample = font.render(FINGERPRINT_SAMPLE,1,(255,255,255))
+        _fingerprints[font] = (font.get_height(),font.get_ascent(),
+                               font.get_descent(),font.get_linesize(),
+                               font.get_bold(),font.get_italic(),
+                               font.get_underline(),pixel_hash(sample))
+    return _fingerprints[font]
+
+
+def stable_key(key):
+    """Replace surfaces and fonts in a cache key with their fingerprints."""
+    if isinstance(key,(tuple,list)):
+        return tuple(stable_key(part) for part in key)
+    elif isinstance(key,pg.Surface):
+        return image_fingerprint(key)
+    elif isinstance(key,pg.font.Font):
+        return font_fingerprint(key)
+    elif isinstance(key,pg.Color):
+        return tuple(key)
+    return key
+
+
+def storable(key):
+    """Check if a key can be written to the index (strings, numbers, None
+    and tuples of them)."""
+    if isinstance(key,tuple):
+        return all(storable(part) for part in key)
+    return key is None or isinstance(key,(str,int,float))
+
+
+def tuples(value):
+    """Turn the lists of a value read from the index back into tuples."""
+    if isinstance(value,list):
+        return tuple(tuples(part) for part in value)
+    return value
+
+
+def encode(surface):
+    """Return the format and raw pixels of surface.  Surfaces with per-pixel
+    alpha are kept in the layout pygame renders text in."""
+    if surface.get_flags()&pg.SRCALPHA:
+        return "BGRA",pg.image.tobytes(surface,"BGRA")
+    return "RGBX",pg.image.tobytes(surface,"RGBX")
+
+
+def decode(data,size,form):
+    """Wrap raw pixels as a surface.  Opaque surfaces are converted to the
+    display format if there is a display."""
+    surface = pg.image.frombuffer(data,size,form)
+    if form == "RGBX" and pg.display.get_surface():
+        surface = surface.convert()
+    return surface
+
+
+class DiskCache(object):
+    def __init__(self,directory,max_bytes=256*1024*1024):
+        """Open (or create) the cache in directory.  Once the data file holds
+        max_bytes, nothing more is added; a cache that is found to be larger,
+        damaged, or from another version is started over."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.data_path = os.path.join(directory,"surfaces.bin")
+        self.index_path = os.path.join(directory,"index.json")
+        self.entries = {}
+        self.size = 0
+        self.mapped = None
+        self.pending = {}
+        self.pending_bytes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.load()
+
+    def signature(self):
+        return (VERSION,sys.byteorder,pg.version.ver)
+
+    def load(self):
+        """Read the index and map the data file.  Anything unexpected in the
+        index starts the cache over."""
+        try:
+            with open(self.index_path,encoding="utf-8") as myfile:
+                index = json.load(myfile)
+            data_size = os.path.getsize(self.data_path)
+            size = index["size"]
+            entries = {tuples(key):tuples(entry)
+                       for key,entry in index["entries"]}
+            valid = (tuples(index["signature"]) == self.signature() and
+                     size <= min(data_size,self.max_bytes) and
+                     all(self.valid_entry(entry,size)
+                         for entry in entries.values()))
+        except (IOError,OSError,ValueError,TypeError,KeyError):
+            return self.reset()
+        if not valid:
+            return self.reset()
+        self.entries = entries
+        self.size = size
+        self.map()
+
+    def valid_entry(self,entry,data_size):
+        """Check that an index entry describes pixels inside the data file."""
+        offset,length,(width,height),form = entry
+        numbers = (offset,length,width,height)
+        return (form in FORMS and all(type(n) is int for n in numbers) and
+                min(numbers) >= 0 and length == width*height*4 and
+                offset+length <= data_size)
+
+    def map(self):
+        if self.size:
+            with open(self.data_path,"rb") as myfile:
+                self.mapped = mmap.mmap(myfile.fileno(),self.size,
+                                        access=mmap.ACCESS_COPY)
+
+    def reset(self):
+        """Discard everything stored on disk."""
+        for path in (self.index_path,self.data_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.entries = {}
+        self.size = 0
+        self.mapped = None
+        self.pending = {}
+        self.pending_bytes = 0
+
+    def __contains__(self,key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self,key):
+        """Return the surface stored for key or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        offset,length,size,form = entry
+        if offset < self.size:
+            data = memoryview(self.mapped)[offset:offset+length]
+        else:
+            data = self.pending[offset]
+        return decode(data,size,form)
+
+    def put(self,key,surface):
+        """Store surface under key (unless the cache is full).  Empty
+        surfaces aren't worth storing, and keys the index can't hold (see
+        storable) aren't stored."""
+        if not (surface.get_width() and surface.get_height()):
+            return
+        if not storable(key):
+            return
+        form,data = encode(surface)
+        if self.size+self.pending_bytes+len(data) > self.max_bytes:
+            return
+        offset = self.size+self.pending_bytes
+        self.entries[key] = (offset,len(data),surface.get_size(),form)
+        self.pending[offset] = data
+        self.pending_bytes += len(data)
+
+    def get_or_build(self,key,build):
+        """Return the surface stored for key, or build(), store and return
+        it."""
+        surface = self.get(key)
+        if surface is None:
+            surface = build()
+            self.put(key,surface)
+        return surface
+
+    def flush(self):
+        """Append the surfaces added since the last flush to the data file and
+        rewrite the index.  If another process has changed the data file
+        meanwhile, the new surfaces are dropped instead."""
+        if not self.pending:
+            return
+        with open(self.data_path,"ab") as myfile:
+            if myfile.tell() != self.size:
+                self.drop_pending()
+                return
+            myfile.write(b"".join(self.pending.values()))
+        self.size += self.pending_bytes
+        self.pending = {}
+        self.pending_bytes = 0
+        index = {"signature" : self.signature(),
+                 "size"      : self.size,
+                 "entries"   : list(self.entries.items())}
+        temp_path = self.index_path+".tmp"
+        with open(temp_path,"w",encoding="utf-8") as myfile:
+            json.dump(index,myfile)
+        os.replace(temp_path,self.index_path)
+        self.map()
+
+    def drop_pending(self):
+        self.entries = {key:entry for key,entry in self.entries.items()
+                        if entry[0] < self.size}
+        self.pending = {}
+        self.pending_bytes = 0
@@ -0,0 +1,42 @@
+"""
+Helpers for feeding events to the widgets.  A fast mouse can produce many
+MOUSEMOTION events per frame; coalesce merges each run of them into a single
+event carrying the total movement.  Widgets may list the event types they
+handle in an event_types attribute so that containers can skip them for
+anything else.
+"""
+
+import pygame as pg
+
+
+MOUSE_EVENTS = frozenset((pg.MOUSEBUTTONDOWN,pg.MOUSEBUTTONUP,
+                          pg.MOUSEMOTION))
+
+
+def coalesce(events):
+    """Return events with each run of consecutive MOUSEMOTION events (with
+    the same buttons held) replaced by one event at the final position whose
+    rel is the sum of theirs.  The order of other events is kept."""
+    merged = []
+    for event in events:
+        last = merged[-1] if merged else None
+        if (event.type == pg.MOUSEMOTION and last is not None and
+                last.type == pg.MOUSEMOTION and last.buttons == event.buttons):
+            rel = (last.rel[0]+event.rel[0],last.rel[1]+event.rel[1])
+            attributes = dict(event.__dict__,rel=rel)
+            merged[-1] = pg.event.Event(pg.MOUSEMOTION,attributes)
+        else:
+            merged.append(event)
+    return merged
+
+
+def get(*args,**kwargs):
+    """pygame.event.get with mouse motion coalesced."""
+    return coalesce(pg.event.get(*args,**kwargs))
+
+
+def accepts(obj,event):
+    """Check if obj handles events of this type.  Objects without an
+    event_types attribute (or with it set to None) receive every event."""
+    types = getattr(obj,"event_types",None)
+    return types is None or event.type in types
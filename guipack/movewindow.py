@@ -4,17 +4,25 @@ This class creates a window with a handle by which it can be dragged around.
 
 import pygame as pg
 
-from . import setup
+from . import events, setup, skin, textcache
+from .compositor import merge_rects
+from .profiler import count, timed
 from .subrect import Subrect
 
 
 class MoveWindow(object):
     def __init__(self,subrect,**kwargs):
-        if setup.GFX == None:
-            setup.GFX = setup.load_default_images(setup.DEFAULT_RESOURCES)
         self.subrect = subrect
         self.content = []
         self.drag = False
+        self.moved = (0,0)
+        self.dirty = True
+        self.image = None
+        self.drawn_rect = None
+        self.damage = []
+        self.active = set()
+        self.drawn = {} #Area of each content item when last drawn.
+        self.subrect.set_owner(self)
         self.process_kwargs(kwargs)
         self.prep_images()
         self.make_image()
@@ -39,74 +47,235 @@ class MoveWindow(object):
     def prep_images(self):
         """Prepares the background and handle images."""
         if not self.kwargs["background"]:
-            self.kwargs["background"] = pg.Surface(self.subrect.size)
-            self.kwargs["background"].convert_alpha()
-            self.kwargs["background"].fill(self.kwargs["bg_color"])
-            resize = setup.GFX["alph_grad"].copy()
-            resize = pg.transform.smoothscale(resize,self.subrect.size)
-            self.kwargs["background"].blit(resize,(0,0))
+            color,size = self.kwargs["bg_color"],self.subrect.size
+            self.kwargs["background"] = skin.background(color,size)
         self.make_handle()
+        self.make_base()
 
     def make_handle(self):
-        """Creates the correct sized handle image from an image.  Not very
-        general and would probably need to be edited for other specific handle
-        images."""
+        """Creates the correct sized handle image from an image by stretching
+        everything but the six pixels at either end.  Would probably need to
+        be edited for other specific handle images."""
         dimen = self.subrect.width,self.kwargs["handle_img"].get_height()
-        self.handle = pg.Surface(dimen).convert_alpha()
-        self.handle.fill((0,0,0,0))
-        start_rect = pg.Rect(0,0,6,dimen[1])
-        end_rect = pg.Rect(self.kwargs["handle_img"].get_width()-6,0,6,dimen[1])
-        self.handle.blit(self.kwargs["handle_img"],start_rect,start_rect)
-        self.handle.blit(self.kwargs["handle_img"],(dimen[0]-6,0),end_rect)
-        stretch_rect = (6,0,self.kwargs["handle_img"].get_width()-12,dimen[1])
-        stretch_piece = self.kwargs["handle_img"].subsurface(stretch_rect)
-        stretch = pg.transform.smoothscale(stretch_piece,(dimen[0]-12,dimen[1]))
-        self.handle.blit(stretch,(6,0))
+        self.handle = skin.nine_slice(self.kwargs["handle_img"],(6,0,6,0),
+                                      dimen).copy()
         self.render_text()
         self.handle_rect = Subrect(self.handle.get_rect(),self.subrect)
 
     def render_text(self):
         """Render and blit required text labels."""
         if self.kwargs["text"]:
-            temp = self.kwargs["font"].render(self.kwargs["text"], 1,
-                                              self.kwargs["text_color"])
+            temp = textcache.render(self.kwargs["font"],self.kwargs["text"],
+                                    self.kwargs["text_color"])
             text_rect = temp.get_rect(center = self.handle.get_rect().center)
             self.handle.blit(temp,text_rect)
 
+    def make_base(self):
+        """Compose the background and handle once.  This is used to restore
+        the area under a content item before it is redrawn."""
+        self.base = pg.Surface(self.subrect.size).convert_alpha()
+        self.base.fill((0,0,0,0))
+        self.base.blit(self.kwargs["background"],(0,self.handle_rect.height))
+        self.base.blit(self.handle,self.handle_rect)
+        self.dirty = True
+
+    def invalidate(self):
+        """Force a full recomposition of the window on the next update."""
+        self.dirty = True
+        self.subrect.damage()
+
+    def damaged(self,rect):
+        """Called with each area of the window (relative to the window) that
+        content inside it needs redrawn (see Subrect.set_owner)."""
+        self.damage.append(rect)
+
+    def tracks_damage(self,obj):
+        """Check if a content item reports its own damage."""
+        return getattr(obj.subrect,"owner",None) is obj
+
+    def content_changed(self,obj):
+        """Content items that report their own damage are only updated when
+        damaged, animating or (nested windows) their content list changed.
+        Other items may define is_dirty() to report whether they need
+        redrawing; items that don't are redrawn every frame."""
+        if self.tracks_damage(obj):
+            replaced = getattr(obj,"content_replaced",None)
+            return bool(replaced and replaced())
+        return not hasattr(obj,"is_dirty") or obj.is_dirty()
+
+    def content_replaced(self):
+        """Check if items were added to or removed from self.content (or the
+        content of a nested window) since the window was last drawn."""
+        if self.drawn.keys() != set(self.content):
+            return True
+        return any(self.content_changed(obj) for obj in self.content
+                   if self.tracks_damage(obj))
+
+    def damage_replaced(self):
+        """Damage the areas of content items added to or removed from
+        self.content since the last update, so that content can be appended
+        or removed without invalidating the window."""
+        current = set(self.content)
+        for obj in self.content:
+            if obj not in self.drawn:
+                self.damage.append(pg.Rect(obj.subrect))
+        for obj,rect in self.drawn.items():
+            if obj not in current:
+                self.damage.append(rect)
+
+    def record_drawn(self):
+        """Remember the content drawn and where (see damage_replaced)."""
+        self.drawn = {obj:pg.Rect(obj.subrect) for obj in self.content}
+
+    def content_animating(self,obj):
+        animating = getattr(obj,"animating",None)
+        return bool(animating and animating())
+
+    def animating(self):
+        """True while some content is animating and must be updated every
+        frame."""
+        return bool(self.active)
+
+    def is_dirty(self):
+        """Report whether the window needs to be redrawn on its parent."""
+        changed = [self.content_changed(obj) for obj in self.content]
+        return (self.dirty or any(self.moved) or bool(self.damage) or
+                bool(self.active) or any(changed) or
+                self.drawn.keys() != set(self.content))
+
+    @timed("movewindow.make_image")
     def make_image(self):
         """Draw the background, handle, and any content items contained in
-        the window."""
-        temp = pg.Surface(self.subrect.size).convert_alpha()
-        temp.fill((0,0,0,0))
-        temp.blit(self.kwargs["background"],(0,self.handle_rect.height))
-        temp.blit(self.handle,self.handle_rect)
+        the window.  The composed surface is reused until the window is
+        invalidated or resized."""
+        if not self.image or self.image.get_size() != self.subrect.size:
+            self.image = pg.Surface(self.subrect.size).convert_alpha()
+            count("surfaces")
+        self.image.fill((0,0,0,0))
+        self.image.blit(self.base,(0,0))
         for obj in self.content:
-            obj.update(temp)
-        self.image = temp
+            obj.update(self.image)
+        self.active = set(obj for obj in self.content
+                          if self.content_animating(obj))
+        self.damage = []
+        self.dirty = False
+        self.record_drawn()
+
+    def recomposite(self,visit_all=False):
+        """Update the content items that are damaged, animating or (for items
+        that don't report damage) changed, then restore and redraw only the
+        damaged areas of the cached image; the images of other content are
+        reused as they are.  Returns the damaged areas (relative to the
+        window)."""
+        self.damage_replaced()
+        visit = [obj for obj in self.content if visit_all or
+                 obj in self.active or self.content_changed(obj) or
+                 obj.subrect.collidelist(self.damage) != -1]
+        x,y = self.subrect.rel2display().topleft
+        self.image.set_clip((0,0,0,0)) #Content draws in the second pass.
+        for obj in visit:
+            rects = obj.update(self.image)
+            if self.tracks_damage(obj):
+                self.damage.extend(rect.move(-x,-y) for rect in rects or [])
+            else:
+                self.damage.append(pg.Rect(obj.subrect))
+        self.image.set_clip(None)
+        self.active = set(obj for obj in visit if self.content_animating(obj))
+        damage,self.damage = merge_rects(self.damage,self.image.get_rect()),[]
+        for rect in damage:
+            self.image.set_clip(rect)
+            self.image.fill((0,0,0,0))
+            self.image.blit(self.base,(0,0))
+            for obj in self.content:
+                if obj.subrect.colliderect(rect):
+                    self.draw_content(obj)
+        self.image.set_clip(None)
+        self.record_drawn()
+        count("dirty_rects",len(damage))
+        return damage
+
+    def draw_content(self,obj):
+        """Blit a content item's current image (items without a draw method
+        are updated again instead)."""
+        if hasattr(obj,"draw"):
+            obj.draw(self.image)
+        else:
+            obj.update(self.image)
 
     def update(self,surface):
-        """Update and draw the window to the target surface."""
-        if self.drag:
-            self.subrect.move_ip(pg.mouse.get_rel())
+        """Update and draw the window to the target surface.  Dragging only
+        moves the cached image; content is updated and redrawn only where it
+        was damaged (or for all content if the window moved on screen, so
+        that it can follow the mouse).  Returns a list of the screen rects
+        that changed, including the area left behind if the window moved."""
+        if any(self.moved):
+            self.subrect.move_ip(self.moved)
+            self.moved = (0,0)
             if self.kwargs["clamp"]:
-                try:
-                    self.subrect.clamp_ip(self.subrect.parent)
-                except TypeError:
-                    self.subrect.clamp_ip(pg.display.get_surface().get_rect())
-        self.make_image()
+                parent = self.subrect.parent
+                if parent == "DISPLAY":
+                    bounds = pg.display.get_surface().get_rect()
+                else:
+                    bounds = pg.Rect((0,0),parent.size)
+                self.subrect.clamp_ip(bounds)
+        current = self.subrect.rel2display()
+        if self.dirty:
+            self.make_image()
+            rects = [current]
+        else:
+            damage = self.recomposite(current != self.drawn_rect)
+            rects = [rect.move(current.topleft) for rect in damage]
+        if current != self.drawn_rect:
+            rects = [current]
+            if self.drawn_rect:
+                rects.append(self.drawn_rect)
+            self.drawn_rect = current
+        self.draw(surface)
+        return rects
+
+    def opaque_rect(self):
+        """The screen area that this window covers completely (everything
+        below the handle).  Empty if the background has per-pixel alpha."""
+        if self.kwargs["background"].get_flags()&pg.SRCALPHA:
+            return pg.Rect(0,0,0,0)
+        rect = self.subrect.rel2display()
+        return pg.Rect(rect.x,rect.y+self.handle_rect.height,rect.width,
+                       rect.height-self.handle_rect.height)
+
+    def draw(self,surface):
+        """Blit the current window image without updating it."""
         surface.blit(self.image,self.subrect)
 
+    @property
+    def event_types(self):
+        """The event types handled by the window and its content, or None if
+        some content item handles every type."""
+        types = set(events.MOUSE_EVENTS)
+        for obj in self.content:
+            handled = getattr(obj,"event_types",None)
+            if handled is None:
+                return None
+            types.update(handled)
+        return types
+
+    @timed("movewindow.get_events")
     def get_events(self,event):
         """Process events and return any needed results back up to the
-        caller."""
+        caller.  While dragging, mouse motion is added up and applied on the
+        next update (the window reports itself damaged so that a parent
+        window updates it).  Content items only get the event types they
+        handle."""
         if event.type == pg.MOUSEBUTTONDOWN:
             if event.button == 1:
                 if self.handle_rect.rel2display().collidepoint(event.pos):
                     self.drag = True
-                    pg.mouse.get_rel()
         elif event.type == pg.MOUSEBUTTONUP:
             self.drag = False
+        elif event.type == pg.MOUSEMOTION and self.drag:
+            self.moved = (self.moved[0]+event.rel[0],self.moved[1]+event.rel[1])
+            self.subrect.damage()
         for obj in self.content:
-            get = obj.get_events(event)
-            if get:
-                return get
+            if events.accepts(obj,event):
+                get = obj.get_events(event)
+                if get:
+                    return get
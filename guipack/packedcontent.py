@@ -0,0 +1,194 @@
+"""
+Compact storage for very long ScrollWindow content.  A list of millions of
+short strings spends most of its memory on the string objects themselves;
+PackedContent keeps the text as UTF-8 in a single buffer, one item per line,
+with an array of the offsets at which each item starts.  Items are decoded
+only when they are looked up, so together with virtual mode (which renders
+only the visible rows) a window over millions of lines costs little more
+than the text itself.
+
+Content can be built from any iterable of strings (a generator is consumed
+in batches) or from a text file with load, which memory-maps the file rather
+than reading it.  Items may not contain newlines (ValueError is raised).
+"""
+
+import mmap
+import bisect
+from array import array
+from itertools import accumulate, count, islice, repeat
+from operator import add
+
+
+BATCH = 65536
+SCAN_BLOCK = 1<<20
+MAX_NARROW = 0xffffffff
+NEWLINE_ERROR = "PackedContent items may not contain newlines"
+
+
+def load(path):
+    """Return a PackedContent with the lines of the UTF-8 text file at path.
+    The file is memory-mapped; it is only copied into memory if the content
+    is later changed."""
+    with open(path,"rb") as myfile:
+        try:
+            data = mmap.mmap(myfile.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError:
+            data = b""
+    return PackedContent(data=data,offsets=line_offsets(data))
+
+
+def line_offsets(data):
+    """The start of each line of data followed by the end of the last.  Lines
+    are split a block at a time so the scan runs at C speed.  Each offset is
+    one past the newline ending the previous line (a missing final newline
+    is counted as though it were there)."""
+    offsets = offset_array(len(data)+1)
+    position,block = 0,SCAN_BLOCK
+    while position < len(data):
+        chunk = data[position:position+block]
+        end = chunk.rfind(b"\n")+1
+        if not end:
+            if position+block < len(data):
+                block *= 2
+                continue
+            end = len(chunk)+1
+        lines = chunk[:end].split(b"\n")[:-1] if end <= len(chunk) else [chunk]
+        offsets.extend(map(add,accumulate(map(len,lines)),count(position+1)))
+        position += end
+        block = SCAN_BLOCK
+    return offsets
+
+
+def offset_array(size):
+    """An empty offset array with items wide enough for offsets up to size."""
+    return array("I" if size <= MAX_NARROW else "q",[0])
+
+
+class PackedContent(object):
+    def __init__(self,items=(),data=None,offsets=None):
+        """Pack the strings of the iterable items.  Data and offsets can give
+        an existing buffer (bytes, bytearray or mmap) and its line offsets
+        instead (see load)."""
+        self.data = bytearray() if data is None else data
+        if offsets is None:
+            offsets = offset_array(len(self.data))
+        self.offsets = offsets
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PackedContent index out of range")
+        start,end = self.offsets[index],self.offsets[index+1]-1
+        return str(self.data[start:end],"utf-8")
+
+    def __iter__(self):
+        """Decode the items a batch at a time (one decode and split per
+        batch rather than per item)."""
+        for first in range(0,len(self),BATCH):
+            last = min(first+BATCH,len(self))
+            start,end = self.offsets[first],self.offsets[last]-1
+            for item in str(self.data[start:end],"utf-8").split("\n"):
+                yield item
+
+    def nbytes(self):
+        """The memory used by the text buffer and offsets (a mapped file is
+        counted though it is paged in from disk as needed)."""
+        return len(self.data)+len(self.offsets)*self.offsets.itemsize
+
+    def writable(self):
+        """Copy a read only (bytes or mapped) buffer into memory before it is
+        changed, adding any missing final newline."""
+        if not isinstance(self.data,bytearray):
+            data = bytearray(self.data)
+            if isinstance(self.data,mmap.mmap):
+                self.data.close()
+            self.data = data
+        if len(self.data) < self.offsets[-1]:
+            self.data += b"\n"
+
+    def widen(self,size):
+        """Switch to wider offsets if the buffer is about to exceed what the
+        current ones can hold."""
+        if size > MAX_NARROW and self.offsets.typecode == "I":
+            self.offsets = array("q",self.offsets)
+
+    def shifted(self,offsets,delta):
+        return array(self.offsets.typecode,map(add,offsets,repeat(delta)))
+
+    def append(self,item):
+        """Add a single item to the end."""
+        self.extend([item])
+
+    def extend(self,items):
+        """Add items to the end.  Items are encoded a batch at a time, so a
+        generator is never held in memory all at once.  A batch with an item
+        containing a newline raises ValueError before it is added."""
+        items = iter(items)
+        batch = list(islice(items,BATCH))
+        if batch:
+            self.writable()
+        while batch:
+            encoded = list(map(str.encode,batch))
+            joined = b"\n".join(encoded)
+            if joined.count(b"\n") != len(encoded)-1:
+                raise ValueError(NEWLINE_ERROR)
+            start = len(self.data)
+            self.widen(start+len(joined)+1)
+            self.data += joined
+            self.data += b"\n"
+            self.offsets.extend(map(add,accumulate(map(len,encoded)),
+                                    count(start+1)))
+            batch = list(islice(items,BATCH))
+
+    def insert(self,index,item):
+        """Insert an item before index.  The buffer after it is moved, so
+        this is slow for items near the front of a large content."""
+        if "\n" in item:
+            raise ValueError(NEWLINE_ERROR)
+        self.writable()
+        index = min(max(index+len(self) if index < 0 else index,0),len(self))
+        encoded = item.encode("utf-8")+b"\n"
+        start = self.offsets[index]
+        self.widen(len(self.data)+len(encoded))
+        self.data[start:start] = encoded
+        self.offsets = (self.offsets[:index+1]+
+                        self.shifted(self.offsets[index:],len(encoded)))
+
+    def pop(self,index=-1):
+        """Remove and return the item at index."""
+        item = self[index]
+        self.writable()
+        if index < 0:
+            index += len(self)
+        start,end = self.offsets[index],self.offsets[index+1]
+        del self.data[start:end]
+        self.offsets = (self.offsets[:index+1]+
+                        self.shifted(self.offsets[index+2:],start-end))
+        return item
+
+    def index(self,item):
+        """The index of the first item equal to item.  The buffer is searched
+        for the encoded item and each hit checked against the offsets."""
+        needle = item.encode("utf-8")
+        position = self.data.find(needle)
+        while position >= 0:
+            index = bisect.bisect_right(self.offsets,position)-1
+            if (self.offsets[index] == position and index < len(self) and
+                    self.offsets[index+1]-1 == position+len(needle)):
+                return index
+            position = self.data.find(needle,position+1)
+        raise ValueError("{!r} is not in PackedContent".format(item))
+
+    def close(self):
+        """Release a mapped file.  The content is empty afterwards."""
+        if isinstance(self.data,mmap.mmap):
+            self.data.close()
+        self.data = bytearray()
+        self.offsets = offset_array(0)
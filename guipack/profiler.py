@@ -0,0 +1,208 @@
+"""
+Opt-in per-frame instrumentation.  The widgets report timed phases and
+counters (surfaces allocated, font renders, blits, smoothscales) to the
+shared PROFILER.  While it is disabled (the default) each hook is a single
+attribute check, so the hooks can stay in place in production code.
+
+Widgets use the timed decorator and the count function below.  Typical use
+by an application:
+    profiler.PROFILER.enable()
+    profiler.PROFILER.add_exporter(profiler.FileExporter("profile.jsonl"))
+    while running:
+        profiler.PROFILER.begin_frame()
+        ...
+        profiler.PROFILER.end_frame()
+"""
+
+import json
+import timeit
+import functools
+from collections import deque
+
+import pygame as pg
+
+
+class _NullPhase(object):
+    """Stand-in context manager used while profiling is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    def __init__(self,profiler,name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self,*exc_info):
+        elapsed = timeit.default_timer()-self.start
+        phases = self.profiler.phases
+        phases[self.name] = phases.get(self.name,0.0)+elapsed
+        return False
+
+
+class Profiler(object):
+    def __init__(self,window=600):
+        """Frame times of the last window frames are kept for the rolling
+        percentiles."""
+        self.enabled = False
+        self.frame_times = deque(maxlen=window)
+        self.phases = {}
+        self.counters = {}
+        self.exporters = []
+        self.frame = 0
+        self.frame_start = None
+        self.last = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.frame_start = None
+
+    def phase(self,name):
+        """Return a context manager that adds the time spent inside it to the
+        named phase of the current frame."""
+        if not self.enabled:
+            return NULL_PHASE
+        return _Phase(self,name)
+
+    def count(self,name,amount=1):
+        """Add amount to the named counter of the current frame."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name,0)+amount
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = timeit.default_timer()
+
+    def end_frame(self):
+        """Record the frame, pass a snapshot to the exporters and reset the
+        per-frame phases and counters."""
+        if not self.enabled or self.frame_start is None:
+            return
+        self.frame_times.append(timeit.default_timer()-self.frame_start)
+        self.frame += 1
+        self.last = self.snapshot()
+        for exporter in self.exporters:
+            exporter(self.last)
+        self.phases = {}
+        self.counters = {}
+        self.frame_start = None
+
+    def percentile(self,percent):
+        """Frame time in milliseconds at the given percentile of the rolling
+        window."""
+        if not self.frame_times:
+            return 0.0
+        ordered = sorted(self.frame_times)
+        index = int(round(percent/100.0*(len(ordered)-1)))
+        return ordered[index]*1000
+
+    def snapshot(self):
+        """A dictionary describing the most recent frame."""
+        return {"frame"    : self.frame,
+                "frame_ms" : self.frame_times[-1]*1000,
+                "p50"      : self.percentile(50),
+                "p95"      : self.percentile(95),
+                "p99"      : self.percentile(99),
+                "phases"   : {name:elapsed*1000 for name,elapsed
+                              in self.phases.items()},
+                "counters" : dict(self.counters)}
+
+    def add_exporter(self,exporter):
+        """Exporters are called with each frame's snapshot."""
+        self.exporters.append(exporter)
+
+    def remove_exporter(self,exporter):
+        self.exporters.remove(exporter)
+
+
+class FileExporter(object):
+    def __init__(self,path,every=60):
+        """Append every nth snapshot to path as a line of JSON."""
+        self.path = path
+        self.every = every
+
+    def __call__(self,snapshot):
+        if snapshot["frame"]%self.every == 0:
+            with open(self.path,"a") as myfile:
+                myfile.write(json.dumps(snapshot)+"\n")
+
+
+class ProfilerOverlay(object):
+    def __init__(self,subrect,font,profiler=None,every=30):
+        """A widget showing frame time percentiles and the phases and counters
+        of the last frame.  The text is only rerendered every nth frame."""
+        self.subrect = subrect
+        self.font = font
+        self.profiler = profiler or PROFILER
+        self.every = every
+        self.drawn_frame = None
+        self.image = pg.Surface(self.subrect.size).convert()
+        self.image.fill(0)
+
+    def get_lines(self):
+        last = self.profiler.last
+        lines = ["p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms".format(**last)]
+        for name,elapsed in sorted(last["phases"].items(),key=lambda x:-x[1]):
+            lines.append("{} {:.2f} ms".format(name,elapsed))
+        for name,amount in sorted(last["counters"].items()):
+            lines.append("{} {}".format(name,amount))
+        return lines
+
+    def update(self,surface):
+        """Rerender if enough frames have passed.  Returns the changed screen
+        rects."""
+        rects = []
+        last = self.profiler.last
+        if last and (self.drawn_frame is None or
+                     last["frame"]-self.drawn_frame >= self.every):
+            self.image.fill(0)
+            y = 0
+            for line in self.get_lines():
+                self.image.blit(self.font.render(line,1,(255,255,255)),(2,y))
+                y += self.font.get_linesize()
+            self.drawn_frame = last["frame"]
+            rects.append(self.subrect.rel2display())
+        self.draw(surface)
+        return rects
+
+    def draw(self,surface):
+        surface.blit(self.image,self.subrect)
+
+    def get_events(self,event):
+        pass
+
+
+PROFILER = Profiler()
+
+
+def count(name,amount=1):
+    """Add amount to a counter of the shared profiler."""
+    if PROFILER.enabled:
+        PROFILER.count(name,amount)
+
+
+def timed(name):
+    """Decorator that times each call of a function as the named phase of
+    the shared profiler."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if not PROFILER.enabled:
+                return func(*args,**kwargs)
+            with _Phase(PROFILER,name):
+                return func(*args,**kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+"""
+Render rows on worker threads.  Pygame fonts can be used off the main thread
+as long as each thread has its own font object, so every worker creates one
+with a font factory.  Rows are rendered nearest the focus (the top of the
+view) first; finished surfaces are collected from a queue by the main thread
+with drain, which stops after a time budget so a frame is never held up for
+long.
+"""
+
+import queue
+import timeit
+import threading
+
+
+class Rasterizer(object):
+    def __init__(self,render,font_factory,threads=1):
+        """Start threads workers.  Each calls font_factory once and then
+        render(font,item) for every item it is given."""
+        self.render = render
+        self.condition = threading.Condition()
+        self.finished = queue.Queue()
+        self.generation = 0
+        self.items = []
+        self.todo = bytearray()
+        self.remaining = 0
+        self.running = 0
+        self.focus = 0
+        self.closed = False
+        self.workers = []
+        for _ in range(threads):
+            worker = threading.Thread(target=self.work,args=(font_factory,))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def schedule(self,items,done=None):
+        """Replace any current job with one rendering items.  If given, done
+        is a sequence with a true value for each item that doesn't need
+        rendering.  Results of earlier jobs are discarded."""
+        with self.condition:
+            self.generation += 1
+            self.items = list(items)
+            if done is None:
+                self.todo = bytearray(len(self.items))
+            else:
+                self.todo = bytearray(map(bool,done))
+            self.remaining = self.todo.count(0)
+            self.condition.notify_all()
+
+    def extend(self,items):
+        """Add items to the end of the current job."""
+        with self.condition:
+            self.items.extend(items)
+            added = len(self.items)-len(self.todo)
+            self.todo.extend(bytearray(added))
+            self.remaining += added
+            self.condition.notify_all()
+
+    def set_focus(self,index):
+        """Render the items nearest index next."""
+        self.focus = index
+
+    def next_job(self):
+        """Claim the unrendered item closest to the focus.  Returns its index
+        or None if there is nothing left to do.  Call with the lock held."""
+        if not self.remaining:
+            return None
+        focus = min(max(self.focus,0),len(self.todo))
+        below = self.todo.find(0,focus)
+        above = self.todo.rfind(0,0,focus)
+        if below < 0 or (above >= 0 and focus-above < below-focus):
+            index = above
+        else:
+            index = below
+        self.todo[index] = 1
+        self.remaining -= 1
+        self.running += 1
+        return index
+
+    def work(self,font_factory):
+        font = font_factory()
+        while True:
+            with self.condition:
+                index = self.next_job()
+                while index is None and not self.closed:
+                    self.condition.wait()
+                    index = self.next_job()
+                if self.closed:
+                    return
+                generation,item = self.generation,self.items[index]
+            try:
+                result = self.render(font,item)
+            except Exception as error:
+                result = error
+            self.finished.put((generation,index,result))
+            with self.condition:
+                self.running -= 1
+
+    def drain(self,budget):
+        """Return a list of (index,surface) for rows finished since the last
+        call, spending no more than about budget seconds.  Errors raised by
+        render on a worker are raised here."""
+        end = timeit.default_timer()+budget
+        results = []
+        while timeit.default_timer() < end:
+            try:
+                generation,index,result = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(result,Exception):
+                raise result
+            if generation == self.generation:
+                results.append((index,result))
+        return results
+
+    def busy(self):
+        """Check if any rows are still waiting to be rendered, being rendered
+        or waiting to be drained."""
+        return (bool(self.remaining or self.running) or
+                not self.finished.empty())
+
+    def close(self):
+        """Stop the workers once they finish their current row."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,121 @@
+"""
+Row geometry for ScrollWindow.  Both classes map between row indices and
+pixel offsets from the top of the content.  UniformRows does so with simple
+arithmetic; RowIndex supports rows of different heights using a Fenwick
+tree of the heights, so offsets, lookups and height changes are O(log n).
+"""
+
+
+class UniformRows(object):
+    def __init__(self,height,count):
+        """count rows, all height pixels tall."""
+        self.row_height = height
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def height(self,index):
+        return self.row_height
+
+    def offset(self,index):
+        """Pixels from the top of the content to the top of row index."""
+        return index*self.row_height
+
+    def find(self,y):
+        """Index of the row containing pixel y."""
+        return y//self.row_height
+
+    def total(self):
+        return self.count*self.row_height
+
+    def append(self,height):
+        self.count += 1
+
+    def extend(self,heights):
+        self.count += len(heights)
+
+    def insert(self,index,height):
+        self.count += 1
+
+    def pop(self,index):
+        self.count -= 1
+
+
+class RowIndex(object):
+    def __init__(self,heights):
+        """Index rows with the given heights."""
+        self.heights = list(heights)
+        self.build()
+
+    def build(self):
+        """(Re)build the tree from self.heights in O(n)."""
+        size = len(self.heights)
+        self.tree = [0]*(size+1)
+        for i,height in enumerate(self.heights,1):
+            self.tree[i] += height
+            parent = i+(i&-i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+        self.top_bit = 1
+        while self.top_bit*2 <= size:
+            self.top_bit *= 2
+
+    def __len__(self):
+        return len(self.heights)
+
+    def height(self,index):
+        return self.heights[index]
+
+    def offset(self,index):
+        """Pixels from the top of the content to the top of row index (the
+        sum of the heights of all rows before it)."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index&-index
+        return total
+
+    def find(self,y):
+        """Index of the row containing pixel y.  Returns the number of rows
+        if y is below the last row."""
+        index = 0
+        step = self.top_bit
+        while step:
+            if index+step < len(self.tree) and self.tree[index+step] <= y:
+                index += step
+                y -= self.tree[index]
+            step //= 2
+        return index
+
+    def total(self):
+        return self.offset(len(self.heights))
+
+    def set_height(self,index,height):
+        """Change the height of a single row."""
+        delta = height-self.heights[index]
+        self.heights[index] = height
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index&-index
+
+    def append(self,height):
+        self.heights.append(height)
+        index = len(self.heights)
+        self.tree.append(height+self.offset(index-1)
+                         -self.offset(index-(index&-index)))
+        if index >= self.top_bit*2:
+            self.top_bit *= 2
+
+    def extend(self,heights):
+        for height in heights:
+            self.append(height)
+
+    def insert(self,index,height):
+        self.heights.insert(index,height)
+        self.build()
+
+    def pop(self,index):
+        self.heights.pop(index)
+        self.build()
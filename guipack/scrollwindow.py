@@ -9,9 +9,15 @@ Free for all purposes. No warranty expressed or implied.
 
 import sys
 import os
+import bisect
 import pygame as pg
 
-from . import setup
+from . import events, setup, skin, textcache
+from .cache import LRUCache
+from .profiler import count, timed
+from .rasterizer import Rasterizer
+from .rowindex import RowIndex, UniformRows
+from .search import Filtered, SearchIndex
 from .subrect import Subrect
 
 
@@ -19,19 +25,37 @@ class ScrollWindow(object):
     def __init__(self,subrect,content,font,**kwargs):
         """Create a scrollbar window with location and size defined by
         rect (x,y,width,height). Content is the list of strings to display
-        in the scroll-window.  Various key-word arguments can also be used
-        to further customize the menu (see process_kwargs for the complete
-        list)."""
-        if setup.GFX == None:
-            setup.GFX = setup.load_default_images(setup.DEFAULT_RESOURCES)
+        in the scroll-window (or tuples of strings, one per column, if keyword
+        "columns" is used).  Very long lists of strings can be given as a
+        PackedContent (see packedcontent), ideally with keyword "virtual".
+        Various key-word arguments can also be used to further customize the
+        menu (see process_kwargs for the complete list)."""
         self.subrect = subrect
         self.content = content
+        self.shown = content
         self.font = font
+        self.query = u""
+        self.typed = u""
+        self.results = []
+        self.search_index = None
         self.highlight_index = None
+        self.mouse = None
+        self.hover_state = None
+        self.dirty = True
+        self.drawn_state = None
+        self.damage_reported = False
+        self.subrect.set_owner(self)
         self.process_kwargs(kwargs)
+        self.event_types = set(events.MOUSE_EVENTS)
+        if self.kwargs["type_ahead"]:
+            self.event_types.add(pg.KEYDOWN)
+        self.placeholder = None
+        self.rasterizer = self.make_rasterizer()
         self.rendered = self.render_content((0,0,0))
+        self.make_search_index()
         self.set_bg_image()
         self.gen_bar_details()
+        self.highlighted = LRUCache(16)
 
     def process_kwargs(self,kwargs):
         """All of the following can be used as keyword arguments.  Any or all
@@ -46,7 +70,22 @@ class ScrollWindow(object):
             "bar_bg_image"          : setup.GFX["bar_bg"],
             "bar_button_images" : [setup.GFX["button"].subsurface((0,0,24,25)),
                                   setup.GFX["button"].subsurface((0,25,24,25))],
-            "bar_slider_image" : setup.GFX["bar"]}
+            "bar_slider_image" : setup.GFX["bar"],
+            "virtual"          : False, #render rows only as they are shown
+            "cache_size"       : 256, #rendered rows kept in virtual mode
+            "follow"           : False, #stay pinned to the bottom on change
+            "smooth"           : False, #pixel scrolling with momentum
+            "scroll_speed"     : 6, #pixels/frame added per wheel click
+            "friction"         : 0.85, #momentum kept each frame
+            "columns"          : None, #column widths for table rows
+            "row_height"       : None, #function(item) for variable heights
+            "row_renderer"     : None, #function(item,color) returning a row
+            "type_ahead"       : None, #"filter" or "jump" on typed text
+            "search"           : "prefix", #or "substring" matching
+            "search_key"       : None, #function(item) giving searched text
+            "render_threads"   : 0, #worker threads rendering rows
+            "font_factory"     : None, #function returning a font per worker
+            "render_budget"    : 2} #ms per frame for rows and search index
         for kwarg in kwargs:
             if kwarg in self.kwargs:
                 self.kwargs[kwarg] = kwargs[kwarg]
@@ -58,33 +97,367 @@ class ScrollWindow(object):
         image; otherwise fill the background surface with the background color.
         (background changable via keyword "bg_color")"""
         if not self.kwargs["background"]:
-            self.kwargs["background"] = pg.Surface(self.subrect.size)
-            self.kwargs["background"].convert_alpha()
-            self.kwargs["background"].fill(self.kwargs["bg_color"])
-            resize = setup.GFX["alph_grad"].copy()
-            resize = pg.transform.smoothscale(resize,self.subrect.size)
-            self.kwargs["background"].blit(resize,(0,0))
+            color,size = self.kwargs["bg_color"],self.subrect.size
+            self.kwargs["background"] = skin.background(color,size)
         self.image = pg.Surface(self.subrect.size).convert()
+        if self.kwargs["smooth"]:
+            self.buffer = pg.Surface(self.subrect.size).convert_alpha()
+            self.buffer_position = None
 
     def render_content(self,color):
-        """Prerender the menu content."""
-        render_list = []
-        for item in self.content:
-            color = self.kwargs["text_color"]
-            render_list.append(self.font.render(item,1,color))
-        return render_list
+        """Prerender the menu content.  In virtual mode nothing is rendered
+        here; rows are rendered as they scroll into view and kept in a
+        bounded cache (size set by keyword "cache_size")."""
+        if self.kwargs["virtual"]:
+            return LRUCache(self.kwargs["cache_size"])
+        if self.rasterizer:
+            self.rasterizer.schedule(self.content)
+            return [None]*len(self.content)
+        return [self.render_item(item) for item in self.content]
+
+    def make_rasterizer(self):
+        """If keyword "render_threads" is set, rows are rendered by that many
+        worker threads, each with a font from keyword "font_factory" (which
+        must match the window's font).  Rows show placeholders until they
+        arrive.  Not used in virtual mode, which never renders ahead."""
+        if not self.kwargs["render_threads"] or self.kwargs["virtual"]:
+            return None
+        if not self.kwargs["font_factory"]:
+            raise ValueError("Keyword render_threads requires font_factory")
+        return Rasterizer(self.rasterize,self.kwargs["font_factory"],
+                          self.kwargs["render_threads"])
+
+    def rasterize(self,font,item):
+        """Render an item on a worker thread with that worker's font.  The
+        shared text cache isn't thread safe so it is bypassed.  A keyword
+        "row_renderer" function is called as is."""
+        color = self.kwargs["text_color"]
+        if self.kwargs["row_renderer"]:
+            return self.kwargs["row_renderer"](item,color)
+        elif self.kwargs["columns"]:
+            return self.render_cells(item,color,font)
+        return font.render(item,1,color)
+
+    def take_rendered(self):
+        """Store the rows finished by the render workers (for no longer than
+        keyword "render_budget" milliseconds) and point the workers at the
+        current view."""
+        if len(self.shown):
+            self.rasterizer.set_focus(self.content_index(self.index))
+        budget = self.kwargs["render_budget"]/1000.0
+        shown = self.shown is self.content
+        bottom = self.rows.find(self.scroll_position()+self.subrect.height)
+        for index,surface in self.rasterizer.drain(budget):
+            self.rendered[index] = surface
+            if not shown or self.index <= index <= bottom:
+                self.buffer_position = None
+                self.dirty = True
+
+    def get_placeholder(self):
+        """A faint bar drawn in place of rows that haven't been rendered."""
+        if self.placeholder is None:
+            size = (self.subrect.width//2,self.height_per_option)
+            self.placeholder = pg.Surface(size,pg.SRCALPHA)
+            color = pg.Color(*self.kwargs["text_color"])
+            color.a = 40
+            self.placeholder.fill(color,(0,3,size[0],size[1]-6))
+        return self.placeholder
+
+    def close(self):
+        """Stop the render workers (if any)."""
+        if self.rasterizer:
+            self.rasterizer.close()
+
+    def render_item(self,item,color=None):
+        """Render a single content item.  Plain strings are rendered through
+        the shared text cache; keywords "row_renderer" and "columns" allow
+        other kinds of rows."""
+        color = color or self.kwargs["text_color"]
+        if self.kwargs["row_renderer"]:
+            return self.kwargs["row_renderer"](item,color)
+        elif self.kwargs["columns"]:
+            return self.render_cells(item,color)
+        return textcache.render(self.font,item,color)
+
+    def render_cells(self,item,color,font=None):
+        """Render a table row, each cell clipped to the width of its column
+        (less a small gap).  If a font is given it is used directly rather
+        than through the text cache."""
+        if font:
+            cells = [font.render(str(cell),1,color) for cell in item]
+        else:
+            font = self.font
+            cells = [textcache.render(font,str(cell),color) for cell in item]
+        height = max([cell.get_height() for cell in cells]+[font.get_height()])
+        row = pg.Surface((sum(self.kwargs["columns"]),height),pg.SRCALPHA)
+        count("surfaces")
+        x = 0
+        for cell,width in zip(cells,self.kwargs["columns"]):
+            row.blit(cell,(x,0),(0,0,max(width-4,0),height))
+            x += width
+        return row
+
+    def make_rows(self):
+        """Create the row geometry.  Rows all have the font height unless
+        keyword "row_height" gives a function returning each item's height."""
+        if self.kwargs["row_height"]:
+            return RowIndex(self.item_height(item) for item in self.shown)
+        return UniformRows(self.height_per_option,len(self.shown))
+
+    def item_height(self,item):
+        return self.kwargs["row_height"](item)
+
+    def variable(self):
+        """True if rows may have different heights."""
+        return isinstance(self.rows,RowIndex)
+
+    def get_rendered(self,index):
+        """Return the rendered surface for the item at index, rendering it
+        first if needed in virtual mode."""
+        if not self.kwargs["virtual"]:
+            rendered = self.rendered[self.content_index(index)]
+            return self.get_placeholder() if rendered is None else rendered
+        item = self.shown[index]
+        rendered = self.rendered.get(item)
+        if rendered is None:
+            rendered = self.render_item(item)
+            self.rendered[item] = rendered
+        return rendered
+
+    def content_index(self,index):
+        """The index in content of the item shown at index."""
+        if self.shown is self.content:
+            return index
+        return self.shown.indices[index]
+
+    def last_index(self):
+        """The largest index that still fills the whole window."""
+        if not self.variable():
+            return max(len(self.shown)-self.options_per_page,0)
+        bottom = max(self.rows.total()-self.subrect.height,0)
+        index = self.rows.find(bottom)
+        if self.rows.offset(index) < bottom:
+            index += 1
+        return index
+
+    def bar_units(self):
+        """The visible and total amounts of content the scroll bar represents:
+        rows for uniform rows and pixels for variable height rows."""
+        if self.variable():
+            return self.subrect.height,self.rows.total()
+        return self.options_per_page,len(self.shown)
+
+    def append(self,item):
+        """Add a single item to the end of the content."""
+        self.extend([item])
+
+    def extend(self,items):
+        """Add several items to the end of the content.  If a filter is
+        active only the new items are matched against it (and the results
+        it was refined from), and the matches are added to the end."""
+        items = list(items)
+        follow = self.index >= self.last_index()
+        start = len(self.content)
+        if self.rasterizer:
+            self.rendered.extend([None]*len(items))
+            self.rasterizer.extend(items)
+        elif not self.kwargs["virtual"]:
+            self.rendered.extend(self.render_item(item) for item in items)
+        self.content.extend(items)
+        shown = len(self.shown)
+        if self.search_index is not None:
+            self.search_index.extend(items)
+            for result in self.results:
+                self.search_index.extend_result(result,start)
+        if self.query:
+            self.shown = Filtered(self.content,self.search(self.query).indices)
+            items = [self.shown[i] for i in range(shown,len(self.shown))]
+        self.rows.extend([self.item_height(item) for item in items]
+                         if self.variable() else items)
+        self.content_resized(follow)
+
+    def insert(self,index,item):
+        """Insert an item before index.  Items inserted above the visible
+        rows shift the index so the view doesn't jump."""
+        follow = self.index >= self.last_index()
+        index = min(max(index+len(self.content) if index<0 else index,0),
+                    len(self.content))
+        if self.rasterizer:
+            self.rendered.insert(index,None)
+        elif not self.kwargs["virtual"]:
+            self.rendered.insert(index,self.render_item(item))
+        self.content.insert(index,item)
+        if self.rasterizer:
+            self.rasterizer.schedule(self.content,self.rendered)
+        if self.search_index is not None:
+            self.search_index.insert(index,item)
+        self.results = []
+        if self.query:
+            return self.refilter()
+        self.rows.insert(index,self.item_height(item) if self.variable() else 0)
+        if index < self.index:
+            self.index += 1
+        self.content_resized(follow)
+
+    def pop(self,index=-1):
+        """Remove and return the item at index."""
+        follow = self.index >= self.last_index()
+        if index < 0:
+            index += len(self.content)
+        item = self.content.pop(index)
+        if not self.kwargs["virtual"]:
+            self.rendered.pop(index)
+        if self.rasterizer:
+            self.rasterizer.schedule(self.content,self.rendered)
+        if self.search_index is not None:
+            self.search_index.pop(index)
+        self.results = []
+        if self.query:
+            self.refilter()
+            return item
+        self.rows.pop(index)
+        if index < self.index:
+            self.index -= 1
+        self.content_resized(follow)
+        return item
+
+    def remove(self,item):
+        """Remove the first occurrence of item."""
+        self.pop(self.content.index(item))
+
+    def set_items(self,content):
+        """Replace the entire content.  The index is kept if possible."""
+        follow = self.index >= self.last_index()
+        self.content = content
+        self.shown = content
+        self.rendered = self.render_content(self.kwargs["text_color"])
+        self.make_search_index()
+        self.results = []
+        if self.query:
+            return self.refilter()
+        self.rows = self.make_rows()
+        self.content_resized(follow)
+
+    def content_resized(self,follow):
+        """Recalculate the scroll bar after the length of the content has
+        changed.  If keyword "follow" is set and the view was at the bottom,
+        it is kept at the bottom (for log tails and the like).  A drag of the
+        slider is cancelled if the content no longer needs scrolling."""
+        self.Bar.set_length(*self.bar_units())
+        if not self.last_index():
+            self.Bar.drag = False
+        if follow and self.kwargs["follow"]:
+            self.index = self.last_index()
+        else:
+            self.index = min(self.index,self.last_index())
+        if self.index == self.last_index():
+            self.offset = 0
+        self.buffer_position = None
+        self.hover_state = None
+        self.invalidate()
+
+    def make_search_index(self):
+        """Start a new search index for the content if keyword "type_ahead"
+        is set.  It is built a little each frame (see build_search_index) so
+        that it is ready before the first key is typed."""
+        self.search_index = None
+        if self.kwargs["type_ahead"]:
+            self.get_search_index()
+
+    def get_search_index(self):
+        """The index used for filtering and jumping (created when first
+        needed).  Keyword "search" selects prefix or substring matching."""
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.content,self.kwargs["search"],
+                                            self.kwargs["search_key"])
+        return self.search_index
+
+    def build_search_index(self):
+        """Build more of an unfinished search index, for no longer than
+        keyword "render_budget" milliseconds.  A search before it is done
+        finishes the build itself."""
+        index = self.search_index
+        if index is not None and not index.complete():
+            index.build_step(self.kwargs["render_budget"]/1000.0)
+
+    def search(self,query):
+        """Return the search result for query.  Results of the queries typed
+        on the way to query are kept, so a query that extends (or backs up
+        to) one of them only has to refine an earlier result."""
+        query = query.lower()
+        index = self.get_search_index()
+        while self.results and not index.refines(self.results[-1].query,query):
+            self.results.pop()
+        if not self.results or self.results[-1].query != query:
+            refine = self.results[-1] if self.results else None
+            self.results.append(index.search(query,refine))
+        return self.results[-1]
+
+    def filter(self,query):
+        """Show only the items matching query; an empty query shows all of
+        them again.  Rows already rendered are reused."""
+        top = self.content_index(self.index) if len(self.shown) else 0
+        self.query = self.typed = query
+        if query:
+            self.shown = Filtered(self.content,self.search(query).indices)
+            self.index = 0
+        else:
+            self.shown = self.content
+            self.results = []
+            self.index = top
+        self.show_changed()
+
+    def refilter(self):
+        """Rerun the current filter after the content has changed."""
+        self.results = []
+        self.shown = Filtered(self.content,self.search(self.query).indices)
+        self.show_changed()
+
+    def show_changed(self):
+        """Rebuild the row geometry and scroll bar for a new set of shown
+        items."""
+        self.rows = self.make_rows()
+        self.offset = 0
+        self.velocity = 0
+        self.content_resized(False)
+
+    def jump(self,query,start=None):
+        """Scroll to the first item matching query at or after index start
+        (the top row by default), wrapping around to the beginning.  Returns
+        the index of the item or None if nothing matches."""
+        if self.shown is not self.content:
+            self.filter(u"")
+        if not query:
+            return None
+        indices = self.search(query).indices
+        if not indices:
+            return None
+        start = self.index if start is None else start
+        found = indices[bisect.bisect_left(indices,start)%len(indices)]
+        self.index = min(found,self.last_index())
+        self.offset = 0
+        self.velocity = 0
+        self.refresh()
+        return found
 
     def activate_highlight(self):
         """Sets the highlight_index to the currently highlighted item.  If no
         items are currently highlighted, highlight_index is set to None.
-        Highlighting can be disabled by setting keyword "highlight" to False."""
+        Highlighting can be disabled by setting keyword "highlight" to False.
+        The mouse position comes from the last mouse event, and nothing is
+        checked unless it, the scroll position or the window have changed."""
         if self.kwargs["highlight"] and not self.Bar.drag:
-            mouse = pg.mouse.get_pos()
-            colly = self.subrect.rel2display().collidepoint(mouse)
+            state = (self.mouse,self.index,self.offset,
+                     self.subrect.rel2display())
+            if state == self.hover_state:
+                return
+            self.hover_state = state
+            mouse = self.mouse
+            colly = mouse and self.subrect.rel2display().collidepoint(mouse)
             if colly and not self.Bar.subrect.rel2display().collidepoint(mouse):
                 relative = self.subrect.rel2self(mouse)[1]
-                offset = relative//self.height_per_option
-                self.highlight_index = self.index + offset
+                self.highlight_index = self.rows.find(self.scroll_position()
+                                                      +relative)
             else:
                 self.highlight_index = None
 
@@ -92,72 +465,258 @@ class ScrollWindow(object):
         """Calculate some needed bar related variables and create a ScrollBar
         instance."""
         self.index = 0
-        self.height_per_option = self.rendered[0].get_size()[1]
+        self.offset = 0
+        self.velocity = 0
+        self.height_per_option = self.font.get_height()
         self.options_per_page = self.subrect.height//self.height_per_option
+        self.rows = self.make_rows()
         if self.kwargs["bar_button_images"]:
             but_size = self.kwargs["bar_button_images"][0].get_size()
         else:
-            but_size = (self.rendered[0].get_height(),)*2
+            but_size = (self.height_per_option,)*2
         bar_r = Subrect((self.subrect.width-but_size[0],0,but_size[0],
                          self.subrect.height),self.subrect)
-        self.Bar = _ScrollBar(bar_r,but_size,self.options_per_page,
-                              len(self.content),self.kwargs)
+        self.Bar = _ScrollBar(bar_r,but_size,self.bar_units(),self.kwargs)
 
     def update_bar_rect(self):
         """Update location of bar_rect. If dragging find new index."""
+        if self.variable():
+            return self.update_variable_bar_rect()
         if self.Bar.drag:
-            mouse_y = pg.mouse.get_pos()[1]
+            mouse_y = self.mouse[1]
             next_ind = self.Bar.drag[1]+int((mouse_y-
                                           self.Bar.drag[0])//self.Bar.perindex)
-            if next_ind <= 0:
-                self.index = 0
-            elif next_ind > len(self.content)-self.options_per_page:
-                self.index = len(self.content)-self.options_per_page
-            else:
-                self.index = next_ind
+            self.index = min(max(next_ind,0),self.last_index())
+            self.offset = 0
+        rows = self.index+self.offset/float(self.height_per_option)
+        self.Bar.slider_rect.y = ( self.Bar.button_size[1]
+                                 +(rows*self.Bar.perindex))
+        if self.index == len(self.shown)-self.options_per_page:
+            self.Bar.slider_rect.y = ( self.Bar.subrect.height
+                                      -self.Bar.button_size[1]
+                                      -self.Bar.slider_rect.height)
+
+    def update_variable_bar_rect(self):
+        """As update_bar_rect, but with the bar measured in pixels of content
+        rather than rows."""
+        if self.Bar.drag:
+            mouse_y = self.mouse[1]
+            self.scroll_to(self.Bar.drag[1]+(mouse_y-self.Bar.drag[0])
+                                            /self.Bar.perindex)
         self.Bar.slider_rect.y = ( self.Bar.button_size[1]
-                                 +(self.index*self.Bar.perindex))
-        if self.index == len(self.content)-self.options_per_page:
+                                 +(self.scroll_position()*self.Bar.perindex))
+        if self.last_index() and self.index >= self.last_index():
             self.Bar.slider_rect.y = ( self.Bar.subrect.height
                                       -self.Bar.button_size[1]
                                       -self.Bar.slider_rect.height)
 
+    @timed("scrollwindow.update_content")
     def update_content(self):
         """Blit the content highlighting if called for."""
-        to_render = self.rendered[self.index:self.index+self.options_per_page]
-        for i,item in enumerate(to_render):
-            if self.index+i == self.highlight_index:
-                temp = pg.Surface((self.subrect.width,item.get_height()))
-                temp.convert_alpha()
-                temp.fill(self.kwargs["highlight_color"])
-                temp.blit(self.font.render(self.content[self.index+i], 1,
-                          self.kwargs["highlight_text_color"]),(5,0))
-                self.image.blit(temp,(0,i*self.height_per_option))
+        if self.variable():
+            top = self.scroll_position()
+            last = self.rows.find(top+self.subrect.height-1)+1
+        else:
+            last = self.index+self.options_per_page
+        last = min(last,len(self.shown))
+        for index in range(self.index,last):
+            y = self.rows.offset(index)-self.rows.offset(self.index)
+            if index == self.highlight_index:
+                self.image.blit(self.get_highlighted(index),(0,y))
             else:
-                self.image.blit(item,(5,i*self.height_per_option))
+                self.image.blit(self.get_rendered(index),(5,y))
+        count("blits",last-self.index)
 
-    def update(self,Surf):
-        """Update entire window."""
+    def scroll_position(self):
+        """Distance in pixels from the top of the content to the top of the
+        window."""
+        return self.rows.offset(self.index)+self.offset
+
+    def scroll_to(self,position):
+        """Scroll so the top of the window is position pixels down the
+        content.  Outside of smooth mode this snaps to the top of the row at
+        position.  Returns False if position had to be clamped."""
+        limit = self.rows.offset(self.last_index())
+        clamped = min(max(int(position),0),limit)
+        self.index = self.rows.find(clamped)
+        self.offset = clamped-self.rows.offset(self.index)
+        if not self.kwargs["smooth"]:
+            self.offset = 0
+        return clamped == int(position)
+
+    def apply_momentum(self):
+        """Scroll by the current velocity and slow down (smooth mode)."""
+        if self.velocity:
+            position = self.scroll_position()+int(round(self.velocity))
+            self.velocity *= self.kwargs["friction"]
+            if not self.scroll_to(position) or abs(self.velocity) < 0.5:
+                self.velocity = 0
+
+    def stop_scrolling(self):
+        """Cancel any momentum and snap to the top of the current row."""
+        self.velocity = 0
+        self.offset = 0
+
+    @timed("scrollwindow.update_content")
+    def update_smooth_content(self):
+        """Smooth mode equivalent of update_content.  The rows drawn last
+        frame are kept in a buffer which is shifted with Surface.scroll; only
+        the newly exposed strip has rows drawn into it."""
+        position = self.scroll_position()
+        height = self.subrect.height
+        if self.buffer_position is None:
+            delta = height
+        else:
+            delta = position-self.buffer_position
+        if abs(delta) >= height:
+            self.buffer.fill((0,0,0,0))
+            self.draw_rows(position,0,height)
+        elif delta:
+            self.buffer.scroll(0,-delta)
+            top = height-delta if delta > 0 else 0
+            self.buffer.fill((0,0,0,0),(0,top,self.subrect.width,abs(delta)))
+            self.draw_rows(position,top,top+abs(delta))
+        self.buffer_position = position
+        self.image.blit(self.buffer,(0,0))
+        if self.highlight_index is not None:
+            if self.highlight_index < len(self.shown):
+                y = self.rows.offset(self.highlight_index)-position
+                self.image.blit(self.get_highlighted(self.highlight_index),
+                                (0,y))
+
+    def draw_rows(self,position,top,bottom):
+        """Draw the rows that fall between top and bottom (in window pixels)
+        into the smooth scrolling buffer."""
+        first = max(self.rows.find(position+top)-1,0)
+        last = min(self.rows.find(position+bottom-1)+1,len(self.shown))
+        self.buffer.set_clip((0,top,self.subrect.width,bottom-top))
+        for index in range(first,last):
+            y = self.rows.offset(index)-position
+            self.buffer.blit(self.get_rendered(index),(5,y))
+        self.buffer.set_clip(None)
+        count("blits",max(last-first,0))
+
+    def get_highlighted(self,index):
+        """Return the highlighted version of the row at index (the highlight
+        bar with the text drawn over it).  These are cached by text, so
+        rendering only happens when the highlight moves to a row that hasn't
+        been highlighted recently."""
+        item = self.shown[index]
+        highlighted = self.highlighted.get(item)
+        if highlighted is None:
+            text = self.render_item(item,self.kwargs["highlight_text_color"])
+            height = text.get_height()
+            if self.variable():
+                height = max(height,self.rows.height(index))
+            highlighted = pg.Surface((self.subrect.width,height)).convert()
+            count("surfaces")
+            highlighted.fill(self.kwargs["highlight_color"])
+            highlighted.blit(text,(5,0))
+            self.highlighted[item] = highlighted
+        return highlighted
+
+    def get_state(self):
+        """The values that determine what the window currently looks like."""
+        return (self.index,self.offset,self.highlight_index,
+                self.Bar.slider_rect.y)
+
+    def refresh(self):
+        """Bring the highlight and slider up to date.  If the window no longer
+        looks the way it was last drawn it is invalidated.  Returns whether
+        the window needs to be redrawn."""
         self.activate_highlight()
         self.update_bar_rect()
-        self.image.blit(self.kwargs["background"],(0,0))
-        self.update_content()
-        self.Bar.update(self.image)
+        if self.get_state() != self.drawn_state:
+            self.invalidate()
+        return self.dirty
+
+    def invalidate(self):
+        """Mark the window for redrawing and report the damage to the widgets
+        it is drawn on (see Subrect.damage), once until it is redrawn."""
+        self.dirty = True
+        if not self.damage_reported:
+            self.subrect.damage()
+            self.damage_reported = True
+
+    def damaged(self,rect):
+        """Called when part of the window (the scroll bar) changes shape."""
+        self.dirty = True
+
+    def animating(self):
+        """True while the window changes from frame to frame without being
+        sent events: while momentum scrolling, waiting for rendered rows or
+        building the search index.  Parents keep updating animating content
+        even if it isn't damaged."""
+        busy = self.rasterizer and self.rasterizer.busy()
+        index = self.search_index
+        building = index is not None and not index.complete()
+        return bool(self.velocity or busy or building)
+
+    def is_dirty(self):
+        """Take any newly rendered rows, build more of the search index,
+        apply momentum, refresh the highlight and slider and report whether
+        the window needs to be redrawn."""
+        if self.rasterizer:
+            self.take_rendered()
+        self.build_search_index()
+        self.apply_momentum()
+        return self.refresh()
+
+    def update(self,Surf):
+        """Update entire window.  The window image is only redrawn if
+        something has changed since the last update.  Returns a list of the
+        screen rects that changed."""
+        rects = []
+        if self.is_dirty():
+            self.image.blit(self.kwargs["background"],(0,0))
+            if self.kwargs["smooth"]:
+                self.update_smooth_content()
+            else:
+                self.update_content()
+            self.Bar.update(self.image)
+            self.drawn_state = self.get_state()
+            self.dirty = False
+            self.damage_reported = False
+            rects.append(self.subrect.rel2display())
+        self.draw(Surf)
+        return rects
+
+    def draw(self,Surf):
+        """Blit the current window image without updating it."""
         Surf.blit(self.image,self.subrect)
 
+    @timed("scrollwindow.get_events")
     def get_events(self,event):
         """Process events for window.  This must be passed events from the main
         event loop of your program.  A selected content string will be returned
-        if clicked while highlighted."""
+        if clicked while highlighted.  Hovering and dragging the slider follow
+        the positions of the mouse events received, and the window is
+        refreshed after each event so that it is only damaged (and redrawn)
+        if the event changed it.  Motion outside the window can't change it
+        unless a row is highlighted or the slider is being dragged."""
+        selected = self.handle_event(event)
+        outside = (event.type == pg.MOUSEMOTION and self.hover_state and
+                   self.highlight_index is None and not self.Bar.drag and
+                   not self.subrect.rel2display().collidepoint(event.pos))
+        if not outside:
+            self.refresh()
+        return selected
+
+    def handle_event(self,event):
+        """Handle a single event (see get_events)."""
+        if event.type in events.MOUSE_EVENTS:
+            self.mouse = event.pos
         if event.type == pg.MOUSEBUTTONDOWN:
+            self.activate_highlight()
             if event.button == 1:
                 if self.highlight_index != None:
                     try:
-                        return self.content[self.highlight_index]
+                        return self.shown[self.highlight_index]
                     except IndexError:
                         pass
                 elif (self.Bar.subrect.rel2display().collidepoint(event.pos)
-                            and len(self.content) > self.options_per_page):
+                            and self.last_index()):
+                    self.stop_scrolling()
                     if self.on_arrow_click(event):
                         pass
                     else:
@@ -166,15 +725,46 @@ class ScrollWindow(object):
                 self.on_scroll_wheel(event)
         elif event.type == pg.MOUSEBUTTONUP:
             self.Bar.drag = False
+            self.hover_state = None
+        elif event.type == pg.KEYDOWN and self.kwargs["type_ahead"]:
+            self.on_key(event)
+
+    def on_key(self,event):
+        """Type-ahead: printable keys extend the query, backspace shortens it
+        and escape clears it.  In "jump" mode return moves to the next
+        match."""
+        query = self.typed
+        if event.key == pg.K_BACKSPACE:
+            query = query[:-1]
+        elif event.key == pg.K_ESCAPE:
+            query = u""
+        elif event.key == pg.K_RETURN:
+            if self.kwargs["type_ahead"] == "jump":
+                self.jump(query,self.index+1)
+            return
+        elif event.unicode and event.unicode >= u" ":
+            query += event.unicode
+        else:
+            return
+        if self.kwargs["type_ahead"] == "filter":
+            self.filter(query)
+        else:
+            self.jump(query)
+            self.typed = query
 
     def on_scroll_wheel(self,event):
-        if event.button == 4:
+        if self.kwargs["smooth"]:
+            if event.button in (4,5):
+                speed = self.kwargs["scroll_speed"]
+                self.velocity += speed if event.button == 5 else -speed
+                self.invalidate() #Start updating so momentum is applied.
+        elif event.button == 4:
             #Scroll wheel up.
             if self.index:
                 self.index -= 1
         elif event.button == 5:
             #Scroll wheel down.
-            if self.index < len(self.content)-self.options_per_page:
+            if self.index < self.last_index():
                 self.index += 1
 
     def on_arrow_click(self,event):
@@ -186,7 +776,7 @@ class ScrollWindow(object):
             return 1
         elif buttons[1].rel2display().collidepoint(event.pos):
             #User clicks down arrow.
-            if self.index < len(self.content)-self.options_per_page:
+            if self.index < self.last_index():
                 self.index += 1
             return 1
         return 0
@@ -195,7 +785,16 @@ class ScrollWindow(object):
         slider = self.Bar.slider_rect
         if slider.rel2display().collidepoint(event.pos):
             #User clicks slide bar.
-            self.Bar.drag = (event.pos[1],self.index)
+            if self.variable():
+                self.Bar.drag = (event.pos[1],self.scroll_position())
+            else:
+                self.Bar.drag = (event.pos[1],self.index)
+        elif self.variable():
+            #User clicks above or below slide bar; page by window height.
+            page = self.subrect.height
+            if event.pos[1] < slider.rel2display().y:
+                page = -page
+            self.scroll_to(self.scroll_position()+page)
         elif event.pos[1] < slider.rel2display().y:
             #User clicks area above slide bar.
             if self.index - self.options_per_page > 0:
@@ -204,7 +803,7 @@ class ScrollWindow(object):
                 self.index = 0
         elif event.pos[1] > slider.rel2display().bottom:
             #User clicks area below slide bar.
-            max_index = len(self.content)-self.options_per_page
+            max_index = len(self.shown)-self.options_per_page
             if self.index+self.options_per_page < max_index:
                 self.index += self.options_per_page
             else:
@@ -212,12 +811,11 @@ class ScrollWindow(object):
 
 
 class _ScrollBar(object):
-    def __init__(self,subrect,button_size,opts_per,length,kwarg_dict):
+    def __init__(self,subrect,button_size,units,kwarg_dict):
         """Contains details of target rects and how to draw the scroll bar
-        itself."""
+        itself.  Units is the visible and total amount of content."""
         self.subrect = subrect
-        self.opts_per = opts_per
-        self.length = float(length)
+        self.opts_per,self.length = units[0],float(units[1])
         self.kwargs = kwarg_dict
         self.button_size = button_size
         rect_one = Subrect(((0,0),self.button_size),self.subrect)
@@ -228,6 +826,15 @@ class _ScrollBar(object):
         self.slider_rect = Subrect((0,self.button_size[1],self.button_size[0],
                                     self.barsize),self.subrect)
         self.drag = False
+        self.track_size = None
+        self.slider_size = None
+
+    def set_length(self,opts_per,length):
+        """Resize the slider for a new content length."""
+        self.opts_per = opts_per
+        self.length = float(length)
+        self.barsize,self.perindex = self.make_bar()
+        self.slider_rect.height = int(self.barsize)
 
     def make_bar(self):
         """Calculate size of bar and the number of pixels between items in the
@@ -243,14 +850,23 @@ class _ScrollBar(object):
             perindex = 10
         return barsize,perindex
 
+    @timed("scrollbar.make_image")
     def make_image(self):
         """Draw all elements of the scroll bar. Defaults are used if images
-        have not been provided."""
+        have not been provided.  The track and slider images are cached and
+        only rebuilt when their sizes change."""
+        if self.subrect.size != self.track_size:
+            self.make_track()
+        if self.slider_rect.size != self.slider_size:
+            self.make_slider()
+
+    def make_track(self):
+        """Draw the scroll bar background and buttons."""
         temp = pg.Surface(self.subrect.size).convert()
+        count("surfaces")
         if self.kwargs["bar_bg_image"]:
-            resize = pg.transform.smoothscale(self.kwargs["bar_bg_image"],
-                                              self.subrect.size)
-            temp.blit(resize,(0,0))
+            temp.blit(skin.scaled(self.kwargs["bar_bg_image"],
+                                  self.subrect.size),(0,0))
         else:
             temp.fill(0)
         if self.kwargs["bar_button_images"]:
@@ -259,13 +875,22 @@ class _ScrollBar(object):
         else:
             temp.fill((255,0,0),self.button_rects[0])
             temp.fill((255,0,0),self.button_rects[1])
+        self.track = temp
+        self.track_size = self.subrect.size
+
+    def make_slider(self):
+        """Draw the slider at its current size.  Only a slider that isn't
+        found in the cache counts as an allocation."""
         if self.kwargs["bar_slider_image"]:
-            temp.blit(self.bar_from_image(),self.slider_rect)
+            key = ("slider",self.kwargs["bar_slider_image"],
+                   self.slider_rect.size)
+            self.slider = skin.cached(key,self.bar_from_image)
         else:
-            temp.fill((0,0,255),self.slider_rect)
-            inner = self.slider_rect.inflate((-2,-2))
-            temp.fill(-1,inner)
-        self.image = temp
+            self.slider = pg.Surface(self.slider_rect.size).convert()
+            count("surfaces")
+            self.slider.fill((0,0,255))
+            self.slider.fill(-1,self.slider.get_rect().inflate((-2,-2)))
+        self.slider_size = self.slider_rect.size
 
     def bar_from_image(self):
         """Creates a slider of the needed size based on a slider image.
@@ -281,9 +906,11 @@ class _ScrollBar(object):
         top = raw.subsurface((0,0,raw_rect.width,2))
         bottom = raw.subsurface((0,raw_rect.height-2,raw_rect.width,2))
         bar_img = pg.Surface(self.slider_rect.size).convert()
+        count("surfaces")
         image_center_rect = center.get_rect(center=bar_img.get_rect().center)
-        for j in range(self.slider_rect.height):
-            bar_img.blit(filler,(0,j))
+        filler = pg.transform.scale(filler,(raw_rect.width,
+                                            self.slider_rect.height))
+        bar_img.blit(filler,(0,0))
         bar_img.blit(center,image_center_rect) #middle of bar
         bar_img.blit(top,(0,0)) #top of bar
         bar_img.blit(bottom,(0,self.slider_rect.height-2))
@@ -291,4 +918,5 @@ class _ScrollBar(object):
 
     def update(self,surface):
         self.make_image()
-        surface.blit(self.image,self.subrect)
+        surface.blit(self.track,self.subrect)
+        surface.blit(self.slider,self.slider_rect.move(self.subrect.topleft))
@@ -0,0 +1,344 @@
+"""
+Case insensitive search over the content of a ScrollWindow.  A SearchIndex
+matches either prefixes of the items (using a sorted copy of the item text,
+so the matches of a query are found with a pair of binary searches) or
+arbitrary substrings (using posting lists of the trigrams in each item).  The
+index is built the first time it is needed; call build to do so ahead of
+time, or build_step to spread the work over several frames.  Items added,
+inserted or removed are updated in place rather than rebuilding the index.
+Substring queries shorter than a trigram are answered by scanning the items
+(or the previous result), which is noticeably slower on very long lists.
+
+Searches can refine an earlier result: when a query extends the previous
+one only the previous matches are considered, so each keystroke of a
+type-ahead filter only has to narrow the last result.
+"""
+
+import bisect
+import heapq
+import timeit
+from array import array
+from itertools import compress, islice, repeat
+from operator import add, contains, sub
+
+
+LAST_CHARACTER = u"\U0010ffff"
+TEXT_BATCH = 4096
+GRAM_BATCH = 256
+SORT_RUN = 16384
+MERGE_BATCH = 4096
+
+
+def search_text(item):
+    """The text searched for an item: strings as they are, tuples (table
+    rows) as their cells separated by spaces."""
+    if isinstance(item,(tuple,list)):
+        return u" ".join(str(cell) for cell in item)
+    return str(item)
+
+
+class Result(object):
+    def __init__(self,query,indices,span=None):
+        """The sorted indices of the items matching query.  For prefix
+        searches span is the matching range of the sorted item text."""
+        self.query = query
+        self.indices = indices
+        self.span = span
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def item_grams(text):
+    """The distinct trigrams of an item's text."""
+    return set(text[i:i+3] for i in range(len(text)-2))
+
+
+class SearchIndex(object):
+    def __init__(self,items,mode="prefix",key=None):
+        """Index items for searching.  Mode is "prefix" or "substring"; key
+        is a function giving the text of an item (see search_text).  Items
+        are read as the index is built, so they should be the content itself
+        (changes are passed on with extend, insert and pop)."""
+        if mode not in ("prefix","substring"):
+            raise ValueError("Invalid search mode: {}".format(mode))
+        self.mode = mode
+        self.key = key or search_text
+        self.items = items
+        self.text = [] #Lowercased text of the items read so far.
+        self.runs = [] #Sorted runs of the first self.sorted items.
+        self.sorted = 0
+        self.merging = None
+        self.order = None
+        self.rank = None
+        self.grams = None
+        self.where = array("i") #Item position by posting list id (-1 if gone).
+        self.renumbered = False #Ids no longer equal positions.
+        self.shuffled = False #Ids no longer in position order.
+        self.indexed = 0 #Items added to the posting lists so far.
+
+    def __len__(self):
+        return len(self.items)
+
+    def extend(self,items):
+        """Index items added to the end of the content.  They are inserted
+        into the existing index rather than rebuilding it (items the build
+        hasn't read up to yet are left to it)."""
+        items = list(items)
+        start = len(self.text)
+        if start+len(items) < len(self.items):
+            return
+        self.text.extend(self.key(item).lower() for item in items)
+        if self.grams is not None and self.indexed == start:
+            for index in range(start,len(self.text)):
+                self.add_grams(index)
+            self.indexed = len(self.text)
+        if self.order is not None:
+            for index in range(start,len(self.text)):
+                self.add_key(index)
+
+    def extend_result(self,result,start):
+        """Add the items from index start on (just added to the end of the
+        content) that match result.query to an earlier result.  The result's
+        array is extended in place."""
+        if self.mode == "prefix":
+            test = str.startswith
+            lo = bisect.bisect_left(self.keys,result.query)
+            hi = bisect.bisect_left(self.keys,result.query+LAST_CHARACTER)
+            result.span = (lo,hi)
+        else:
+            test = contains
+        found = map(test,self.text[start:],repeat(result.query))
+        result.indices.extend(compress(range(start,len(self.text)),found))
+
+    def build(self):
+        """Build the index for the search mode now rather than on the first
+        search."""
+        self.build_step(None)
+
+    def build_step(self,budget):
+        """Build part of the index, stopping once budget seconds have passed
+        (None builds all of it).  The work is done a batch at a time (see
+        build_batch).  Returns True once the index is complete."""
+        end = None if budget is None else timeit.default_timer()+budget
+        while not self.complete():
+            self.build_batch()
+            if end is not None and timeit.default_timer() >= end:
+                break
+        return self.complete()
+
+    def build_batch(self):
+        """Do the next batch of work on the index.  The text of the items is
+        read first.  Substring mode then fills the posting lists; prefix mode
+        sorts runs of items and merges the runs into the sorted order."""
+        if len(self.text) < len(self.items):
+            start = len(self.text)
+            batch = self.items[start:start+TEXT_BATCH]
+            self.text.extend(self.key(item).lower() for item in batch)
+        elif self.mode == "substring":
+            if self.grams is None:
+                self.grams = {}
+            stop = min(self.indexed+GRAM_BATCH,len(self.text))
+            for index in range(self.indexed,stop):
+                self.add_grams(index)
+            self.indexed = stop
+        elif self.merging is not None:
+            batch = array("i",islice(self.merging,MERGE_BATCH))
+            self.merged.extend(batch)
+            self.merged_keys.extend(map(self.text.__getitem__,batch))
+            if len(self.merged) == self.sorted:
+                self.finish_prefix()
+        elif self.sorted < len(self.text):
+            run = range(self.sorted,min(self.sorted+SORT_RUN,len(self.text)))
+            self.runs.append(array("i",sorted(run,key=self.text.__getitem__)))
+            self.sorted = run.stop
+        else:
+            self.merging = heapq.merge(*self.runs,key=self.text.__getitem__)
+            self.merged,self.merged_keys,self.runs = array("i"),[],[]
+
+    def finish_prefix(self):
+        """Use the merged runs as the sorted order, adding any items appended
+        while they were being merged."""
+        self.order,self.keys = self.merged,self.merged_keys
+        self.merging = self.merged = self.merged_keys = None
+        self.rank = None
+        for index in range(self.sorted,len(self.text)):
+            self.add_key(index)
+
+    def restart_prefix(self,index):
+        """Throw away an unfinished sorted order if it includes items at or
+        after index (whose indices just changed)."""
+        if self.order is None and index < self.sorted:
+            self.runs,self.sorted,self.merging = [],0,None
+
+    def complete(self):
+        """Check if the index for the search mode has been fully built."""
+        if len(self.text) < len(self.items):
+            return False
+        if self.mode == "prefix":
+            return self.order is not None
+        return self.grams is not None and self.indexed == len(self.text)
+
+    def insert(self,index,item):
+        """Index an item inserted before index.  The items after it move up
+        one; the posting lists hold item ids rather than positions, so only
+        the sorted order and the position of each id are shifted."""
+        if index > len(self.text):
+            return
+        text = self.key(item).lower()
+        self.text.insert(index,text)
+        self.restart_prefix(index)
+        if self.order is not None:
+            self.order = array("i",map(add,self.order,
+                                       map(index.__le__,self.order)))
+            self.add_key(index)
+        if self.grams is not None and index <= self.indexed:
+            if index < self.indexed:
+                self.renumbered = self.shuffled = True
+            self.where = array("i",map(add,self.where,
+                                       map(index.__le__,self.where)))
+            self.add_grams(index)
+            self.indexed += 1
+
+    def pop(self,index):
+        """Remove the item at index from the index."""
+        if index >= len(self.text):
+            return
+        text = self.text.pop(index)
+        self.restart_prefix(index)
+        if self.order is not None:
+            position = bisect.bisect_left(self.keys,text)
+            while self.order[position] != index:
+                position += 1
+            del self.keys[position]
+            del self.order[position]
+            self.order = array("i",map(sub,self.order,
+                                       map(index.__lt__,self.order)))
+            self.rank = None
+        if self.grams is not None and index < self.indexed:
+            item_id = self.where.index(index)
+            for gram in item_grams(text):
+                postings = self.grams[gram]
+                del postings[bisect.bisect_left(postings,item_id)]
+                if not postings:
+                    del self.grams[gram]
+            self.where[item_id] = -1
+            self.renumbered = True
+            self.where = array("i",map(sub,self.where,
+                                       map(index.__lt__,self.where)))
+            self.indexed -= 1
+
+    def add_key(self,index):
+        """Insert an item into the sorted order.  The ranks are rebuilt the
+        next time they are needed."""
+        position = bisect.bisect_right(self.keys,self.text[index])
+        self.keys.insert(position,self.text[index])
+        self.order.insert(position,index)
+        self.rank = None
+
+    def get_rank(self):
+        """The position of each item in the sorted order (the inverse of the
+        order, found by sorting rather than a Python loop)."""
+        if self.rank is None:
+            self.rank = array("i",sorted(range(len(self.order)),
+                                         key=self.order.__getitem__))
+        return self.rank
+
+    def add_grams(self,index):
+        """Add the item at index to the posting lists of its trigrams under a
+        new id.  Ids only increase, so each list stays sorted."""
+        item_id = len(self.where)
+        self.where.append(index)
+        for gram in item_grams(self.text[index]):
+            if gram not in self.grams:
+                self.grams[gram] = array("i")
+            self.grams[gram].append(item_id)
+
+    def positions(self,postings):
+        """The item positions of a posting list in item order.  Ids are the
+        positions until an item is inserted or removed, and stay in item
+        order unless an item is inserted before the last one indexed."""
+        if not self.renumbered:
+            return array("i",postings)
+        positions = map(self.where.__getitem__,postings)
+        if self.shuffled:
+            positions = sorted(positions)
+        return array("i",positions)
+
+    def search(self,query,refine=None):
+        """Return a Result with the items matching query.  If refine is the
+        result of an earlier search whose matches include all of those of
+        query, only those are searched.  An unfinished index is completed
+        first."""
+        query = query.lower()
+        if not self.complete():
+            self.build()
+        if refine is not None and not self.refines(refine.query,query):
+            refine = None
+        if self.mode == "prefix":
+            return self.search_prefix(query,refine)
+        return self.search_substring(query,refine)
+
+    def refines(self,previous,query):
+        """Check if the matches of query are a subset of those of previous."""
+        if self.mode == "prefix":
+            return query.startswith(previous)
+        return previous in query
+
+    def search_prefix(self,query,refine):
+        """The matches are a range of the sorted order.  A small range is
+        sorted back into item order; if most candidates match it is cheaper
+        to keep the candidates whose rank falls in the range.  Each result
+        gets its own array (see extend_result)."""
+        if refine:
+            candidates,(lo,hi) = refine.indices,refine.span
+        else:
+            candidates,lo,hi = range(len(self.keys)),0,len(self.keys)
+        lo = bisect.bisect_left(self.keys,query,lo,hi)
+        hi = bisect.bisect_left(self.keys,query+LAST_CHARACTER,lo,hi)
+        if hi-lo == len(candidates):
+            indices = array("i",candidates)
+        elif (hi-lo)*4 < len(candidates):
+            indices = array("i",sorted(self.order[lo:hi]))
+        else:
+            span = range(lo,hi)
+            rank = self.get_rank()
+            found = map(span.__contains__,map(rank.__getitem__,candidates))
+            indices = array("i",compress(candidates,found))
+        return Result(query,indices,(lo,hi))
+
+    def search_substring(self,query,refine):
+        """The candidates are the items of the rarest trigram of query (or
+        the refined result if it is smaller), which are checked for the whole
+        query.  If every item is a candidate the text is scanned directly."""
+        candidates = refine.indices if refine else None
+        if len(query) >= 3:
+            empty = array("i")
+            postings = [self.grams.get(query[i:i+3],empty)
+                        for i in range(len(query)-2)]
+            rarest = min(postings,key=len)
+            if len(query) == 3:
+                return Result(query,self.positions(rarest))
+            if len(rarest) == len(self.text):
+                candidates = None
+            elif candidates is None or len(rarest) < len(candidates):
+                candidates = self.positions(rarest)
+        if candidates is None or len(candidates) == len(self.text):
+            candidates,texts = range(len(self.text)),self.text
+        else:
+            texts = map(self.text.__getitem__,candidates)
+        found = map(contains,texts,repeat(query))
+        return Result(query,array("i",compress(candidates,found)))
+
+
+class Filtered(object):
+    def __init__(self,items,indices):
+        """A read only view of the items at the given indices."""
+        self.items = items
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self,index):
+        return self.items[self.indices[index]]
@@ -1,15 +1,137 @@
+import io
 import os
+import json
 import pygame as pg
 
 
 DEFAULT_RESOURCES = os.path.join(os.path.dirname(__file__),'graphics')
-GFX = None
+IMAGE_EXTENSIONS = ['png','jpg','bmp']
+
+
+def convert(image):
+    """Convert to the display format, keeping per-pixel alpha only for images
+    that have it."""
+    if image.get_flags()&pg.SRCALPHA:
+        return image.convert_alpha()
+    return image.convert()
+
+
+class ResourceManager(object):
+    """Dictionary style access to skin images by name (the file name without
+    its extension).  Images are only loaded when first requested and are
+    converted to the display format (once) after a display mode is set.  Skin
+    directories and atlas files can be registered; those registered later
+    take precedence over earlier ones."""
+    def __init__(self,*directories):
+        self.sources = []
+        self.images = {}
+        self.converted = set()
+        for directory in directories:
+            self.register_directory(directory)
+
+    def register_directory(self,directory):
+        self.sources.append(("directory",directory))
+
+    def register_atlas(self,path):
+        """Register an atlas file created with pack_atlas.  The file is read
+        (once) the first time an image is requested from it."""
+        self.sources.append(("atlas",{"path":path,"sheet":None,"index":None}))
+
+    def __getitem__(self,name):
+        if name not in self.images:
+            self.images[name] = self.load(name)
+        if name not in self.converted and pg.display.get_surface():
+            self.images[name] = convert(self.images[name])
+            self.converted.add(name)
+        return self.images[name]
+
+    def __contains__(self,name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self,name,default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """All available image names (this scans every source)."""
+        names = set()
+        for kind,source in self.sources:
+            if kind == "directory":
+                names.update(image[:-4] for image in os.listdir(source)
+                             if image[-3:] in IMAGE_EXTENSIONS)
+            else:
+                names.update(self.load_atlas(source)["index"])
+        return sorted(names)
+
+    def load(self,name):
+        """Find and load an image from the most recently registered source
+        that has it."""
+        for kind,source in reversed(self.sources):
+            if kind == "directory":
+                for extension in IMAGE_EXTENSIONS:
+                    path = os.path.join(source,"{}.{}".format(name,extension))
+                    if os.path.isfile(path):
+                        return pg.image.load(path)
+            else:
+                atlas = self.load_atlas(source)
+                if name in atlas["index"]:
+                    x,y,width,height,alpha = atlas["index"][name]
+                    image = atlas["sheet"].subsurface((x,y,width,height))
+                    if not alpha:
+                        opaque = pg.Surface((width,height))
+                        opaque.blit(image,(0,0))
+                        return opaque
+                    return image
+        raise KeyError(name)
+
+    def load_atlas(self,atlas):
+        """Read an atlas file: a line of JSON mapping names to rects on the
+        sheet (and whether the image had per-pixel alpha), followed by the
+        sheet itself as a PNG."""
+        if atlas["sheet"] is None:
+            with open(atlas["path"],"rb") as myfile:
+                header,data = myfile.read().split(b"\n",1)
+            atlas["index"] = json.loads(header.decode("utf-8"))
+            atlas["sheet"] = pg.image.load(io.BytesIO(data),"atlas.png")
+        return atlas
+
+
+def pack_atlas(path,*directories):
+    """Pack every image in the given directories onto a single sheet and save
+    it with its index to path for use with ResourceManager.register_atlas.
+    Images are placed on shelves in order of decreasing height."""
+    manager = ResourceManager(*directories)
+    images = [(name,manager.load(name)) for name in manager.keys()]
+    images.sort(key=lambda item:-item[1].get_height())
+    width = max([1024]+[image.get_width() for name,image in images])
+    index = {}
+    x = y = shelf = 0
+    for name,image in images:
+        if x+image.get_width() > width:
+            x,y,shelf = 0,y+shelf,0
+        alpha = bool(image.get_flags()&pg.SRCALPHA)
+        index[name] = (x,y)+image.get_size()+(alpha,)
+        x += image.get_width()
+        shelf = max(shelf,image.get_height())
+    sheet = pg.Surface((width,max(y+shelf,1)),pg.SRCALPHA)
+    for name,image in images:
+        sheet.blit(image,index[name][:2])
+    data = io.BytesIO()
+    pg.image.save(sheet,data,"atlas.png")
+    with open(path,"wb") as myfile:
+        myfile.write(json.dumps(index).encode("utf-8")+b"\n")
+        myfile.write(data.getvalue())
 
 
 def load_default_images(directory):
-    gfx = {}
-    for image in os.listdir(directory):
-        if image[-3:] in ['png','jpg','bmp']:
-            gfx[image[:-4]] = pg.image.load(os.path.join(directory,image))
-            gfx[image[:-4]].convert_alpha()
-    return gfx
+    """Kept for compatibility; returns a lazy ResourceManager."""
+    return ResourceManager(directory)
+
+
+GFX = ResourceManager(DEFAULT_RESOURCES)
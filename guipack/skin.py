@@ -0,0 +1,100 @@
+"""
+Shared, cached scaling of skin images.  Widgets of the same size and skin
+get the same scaled surfaces rather than each building their own.  Cached
+surfaces are shared; copy them before drawing on them.  If a disk cache is
+enabled (see diskcache) surfaces built by earlier runs are loaded from it, so
+cache keys must include everything a surface is built from.
+"""
+
+import pygame as pg
+
+from . import diskcache, setup
+from .cache import LRUCache
+from .profiler import count
+
+
+CACHE = LRUCache(max_bytes=32*1024*1024)
+
+
+def cached(key,build):
+    """Return the cached surface for key, calling build() to create it if it
+    is not already cached."""
+    result = CACHE.get(key)
+    if result is None:
+        result = diskcache.cached(disk_key(key),build)
+        CACHE[key] = result
+    return result
+
+
+def disk_key(key):
+    """The key used for the disk cache (only computed when one is enabled)."""
+    if diskcache.DISK is None:
+        return None
+    return ("skin",)+diskcache.stable_key(key)
+
+
+def stretch(image,size):
+    """Smoothscale if the image format allows it, otherwise plain scale."""
+    count("smoothscales")
+    try:
+        return pg.transform.smoothscale(image,size)
+    except ValueError:
+        return pg.transform.scale(image,size)
+
+
+def scaled(image,size):
+    """The whole image scaled to size."""
+    return nine_slice(image,(0,0,0,0),size)
+
+
+def background(color,size):
+    """The default widget background: size filled with color and overlaid
+    with the default gradient."""
+    key = ("background",tuple(color),tuple(size),setup.GFX["alph_grad"])
+    return cached(key,lambda: render_background(color,size))
+
+
+def render_background(color,size):
+    """Build a background without consulting the cache."""
+    result = pg.Surface(size)
+    count("surfaces")
+    result.fill(color)
+    result.blit(scaled(setup.GFX["alph_grad"],size),(0,0))
+    return result
+
+
+def nine_slice(image,insets,size):
+    """Return image stretched to size with the borders given by insets
+    (left,top,right,bottom) left unscaled.  Edges are stretched along their
+    length and the center in both directions.  A three-slice is simply a
+    nine-slice with two of the insets set to zero."""
+    key = (image,tuple(insets),tuple(size))
+    return cached(key,lambda: render_nine_slice(image,insets,size))
+
+
+def render_nine_slice(image,insets,size):
+    """Build a nine-slice image without consulting the cache."""
+    if not any(insets):
+        return stretch(image,size)
+    left,top,right,bottom = insets
+    src_w,src_h = image.get_size()
+    src_x = (0,left,src_w-right,src_w)
+    src_y = (0,top,src_h-bottom,src_h)
+    dest_x = (0,left,size[0]-right,size[0])
+    dest_y = (0,top,size[1]-bottom,size[1])
+    result = pg.Surface(size).convert_alpha()
+    count("surfaces")
+    result.fill((0,0,0,0))
+    for i in range(3):
+        for j in range(3):
+            source = pg.Rect(src_x[i],src_y[j],src_x[i+1]-src_x[i],
+                             src_y[j+1]-src_y[j])
+            dest = pg.Rect(dest_x[i],dest_y[j],dest_x[i+1]-dest_x[i],
+                           dest_y[j+1]-dest_y[j])
+            if min(source.size+dest.size) <= 0:
+                continue
+            piece = image.subsurface(source)
+            if source.size != dest.size:
+                piece = stretch(piece,dest.size)
+            result.blit(piece,dest)
+    return result
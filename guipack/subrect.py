@@ -4,11 +4,71 @@ import pygame as pg
 class Subrect(pg.Rect):
     """This class allows the use of rects relative to other rects (hierarchies).
     Absolute position of the rect within the display surface can always be
-    retrieved."""
+    retrieved.  Absolute positions are cached; any change to the geometry or
+    parent of any Subrect advances a shared version counter which invalidates
+    the cached positions.  The counter is global rather than per hierarchy,
+    so while anything moves (a dragged window or slider) every Subrect
+    recomputes its position on the next lookup; the cache pays off in the
+    frames where nothing moves.
+
+    The hierarchy also carries damage.  A widget that composites the widgets
+    inside it registers as the owner of its Subrect (see set_owner) and is
+    told about every area inside it that needs redrawing: areas reported with
+    damage by the widgets below it and the old and new areas of any Subrect
+    below it that moves, resizes or changes parent."""
+    version = 0
+
     def __init__(self, rect, parent="DISPLAY"):
         pg.Rect.__init__(self,rect)
+        self._cache = (None,None)
+        self._owner = None
         self.parent = parent
 
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            pg.Rect.__setattr__(self,name,value)
+            return
+        old = tuple(self)
+        old_parent = self._parent()
+        pg.Rect.__setattr__(self,name,value)
+        if name == "parent" or tuple(self) != old:
+            Subrect.version += 1
+            self._changed(old,old_parent)
+
+    def __setitem__(self, index, value):
+        old = tuple(self)
+        pg.Rect.__setitem__(self,index,value)
+        Subrect.version += 1
+        self._changed(old,self._parent())
+
+    def _parent(self):
+        """The parent, or "DISPLAY" for the uninitialised Subrects returned by
+        Rect methods such as move and copy."""
+        return getattr(self,"parent","DISPLAY")
+
+    def _changed(self, old, old_parent):
+        """Damage the area the rect used to cover and the one it covers now."""
+        _propagate(pg.Rect(old),old_parent)
+        _propagate(pg.Rect(self),self._parent())
+
+    @property
+    def owner(self):
+        return self._owner
+
+    def set_owner(self, owner):
+        """Register the widget drawn in this rect.  Its damaged(rect) method
+        is called with the areas (relative to this rect) that need redrawing
+        because of changes below it in the hierarchy."""
+        self._owner = owner
+
+    def damage(self, rect=None):
+        """Report that rect (relative to this rect; all of it by default)
+        needs to be redrawn.  The area is passed up the hierarchy, clipped to
+        each ancestor in turn, to the owner of every ancestor that has one."""
+        if rect is None:
+            rect = pg.Rect((0,0),self.size)
+        _propagate(pg.Rect(rect).move(self.topleft),self.parent)
+
     def rel2parent(self):
         """Give the rectangle relative to the next level up in the hierarchy."""
         if self.parent == "DISPLAY":
@@ -21,17 +81,57 @@ class Subrect(pg.Rect):
         Most useful when doing collision tests (with the mouse for example) on
         the window. Image generally shouldn't be blitted via the rect from
         this function as that breaks the window hierarchy. Blitting should
-        be done on the parent at location self.subrect."""
+        be done on the parent at location self.subrect.  The position is
+        cached; callers get their own copy, which they may modify."""
+        version,absolute = self._cache
+        if version == Subrect.version:
+            return absolute.copy()
         current = self
         x,y = self.x,self.y
         while current.parent != "DISPLAY":
             current = current.parent
             x += current.x
             y += current.y
-        return pg.Rect((x,y),self.size)
+        absolute = pg.Rect((x,y),self.size)
+        self._cache = (Subrect.version,absolute)
+        return absolute.copy()
 
     def rel2self(self, point):
         """Given a point relative to the display surface, returns a point
         relative to its own window."""
         rel = self.rel2display()
         return (point[0]-rel.x, point[1]-rel.y)
+
+
+def _propagate(rect, parent):
+    """Pass damage (relative to parent) up the hierarchy from parent."""
+    while parent != "DISPLAY":
+        rect = rect.clip(pg.Rect((0,0),parent.size))
+        if not (rect.width and rect.height):
+            return
+        owner = getattr(parent,"_owner",None)
+        if owner is not None:
+            owner.damaged(rect)
+        rect = rect.move(parent.topleft) #The owner may keep the rect.
+        parent = parent.parent
+
+
+def _invalidating(name):
+    """Wrap an in-place Rect method so that it advances the version and
+    damages the old and new areas."""
+    method = getattr(pg.Rect,name)
+    def wrapper(self, *args):
+        old = tuple(self)
+        result = method(self,*args)
+        Subrect.version += 1
+        self._changed(old,self._parent())
+        return result
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ("move_ip","inflate_ip","clamp_ip","union_ip","unionall_ip",
+              "scale_by_ip","normalize","update"):
+    if hasattr(pg.Rect,_name):
+        setattr(Subrect,_name,_invalidating(_name))
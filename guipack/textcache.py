@@ -0,0 +1,41 @@
+"""
+A process-wide cache of rendered text shared by all widgets.  Surfaces are
+cached by (font, text, color, antialias) and discarded least recently used
+first once the byte budget of the cache is exceeded.  Cached surfaces are
+shared; copy them before drawing on them.  If a disk cache is enabled (see
+diskcache) surfaces rendered by earlier runs are loaded from it.
+"""
+
+from . import diskcache
+from .cache import LRUCache
+from .profiler import count
+
+
+CACHE = LRUCache(max_bytes=16*1024*1024)
+
+
+def render(font,text,color,antialias=1):
+    """Return a (shared) surface of text rendered in font and color."""
+    key = (font,text,tuple(color),antialias)
+    rendered = CACHE.get(key)
+    if rendered is None:
+        rendered = diskcache.cached(disk_key(key),
+                                    lambda: rasterize(font,text,color,antialias))
+        CACHE[key] = rendered
+    return rendered
+
+
+def disk_key(key):
+    """The key used for the disk cache (only computed when one is enabled)."""
+    if diskcache.DISK is None:
+        return None
+    return ("text",diskcache.font_fingerprint(key[0]))+key[1:]
+
+
+def rasterize(font,text,color,antialias=1):
+    count("font_renders")
+    return font.render(text,antialias,color)
+
+
+def clear():
+    CACHE.clear()
@@ -0,0 +1,184 @@
+"""
+A manager for several MoveWindows.  It keeps the windows in a stack (the
+last window is on top), raises windows when they are clicked, sends mouse
+events only to the top-most window under the mouse, and skips windows that
+are completely covered by the windows above them.
+"""
+
+import pygame as pg
+
+from .events import MOUSE_EVENTS, accepts
+
+
+def subtract(rect,hole):
+    """Return a list of rects covering the parts of rect outside hole."""
+    clip = rect.clip(hole)
+    if not (clip.width and clip.height):
+        return [rect]
+    pieces = []
+    if clip.top > rect.top:
+        pieces.append(pg.Rect(rect.left,rect.top,rect.width,clip.top-rect.top))
+    if clip.bottom < rect.bottom:
+        pieces.append(pg.Rect(rect.left,clip.bottom,rect.width,
+                              rect.bottom-clip.bottom))
+    if clip.left > rect.left:
+        pieces.append(pg.Rect(rect.left,clip.top,clip.left-rect.left,
+                              clip.height))
+    if clip.right < rect.right:
+        pieces.append(pg.Rect(clip.right,clip.top,rect.right-clip.right,
+                              clip.height))
+    return pieces
+
+
+def covered(rect,occluders):
+    """Check if rect is completely covered by the union of occluders."""
+    occluders = [occluder for occluder in occluders
+                 if occluder.colliderect(rect)]
+    if not occluders or not occluders[0].unionall(occluders).contains(rect):
+        return False
+    first,rest = occluders[0],occluders[1:]
+    if first.contains(rect):
+        return True
+    return all(covered(piece,rest) for piece in subtract(rect,first))
+
+
+class WindowManager(object):
+    def __init__(self,cell_size=64):
+        """Windows are found for mouse events using a grid of cells of
+        cell_size pixels.  Each cell lists the windows that overlap it."""
+        self.cell_size = cell_size
+        self.windows = []
+        self.z_order = {}
+        self.grid = {}
+        self.indexed = {}
+        self.visible = []
+        self.restacked = False
+        self.captured = None
+        self.hovered = None
+        self.damage = []
+
+    def add(self,window):
+        """Add a window on top of the stack."""
+        self.windows.append(window)
+        self.z_order[window] = len(self.windows)-1
+        self.index_window(window)
+        self.restacked = True
+        self.damage.append(window.subrect.rel2display())
+
+    def remove(self,window):
+        self.windows.remove(window)
+        self.unindex_window(window)
+        self.z_order = {win:i for i,win in enumerate(self.windows)}
+        self.restacked = True
+        self.damage.append(window.subrect.rel2display())
+        if self.captured is window:
+            self.captured = None
+        if self.hovered is window:
+            self.hovered = None
+
+    def raise_window(self,window):
+        """Move a window to the top of the stack."""
+        if self.windows[-1] is not window:
+            self.windows.remove(window)
+            self.windows.append(window)
+            self.z_order = {win:i for i,win in enumerate(self.windows)}
+            self.restacked = True
+            self.damage.append(window.subrect.rel2display())
+
+    def cells(self,rect):
+        """All grid cells that a rect overlaps."""
+        size = self.cell_size
+        return [(i,j) for i in range(rect.left//size,(rect.right-1)//size+1)
+                      for j in range(rect.top//size,(rect.bottom-1)//size+1)]
+
+    def index_window(self,window):
+        """Update the grid cells for a window if it has moved.  Returns True
+        if the window was (re)indexed."""
+        rect = window.subrect.rel2display()
+        if window in self.indexed and self.indexed[window][0] == rect:
+            return False
+        self.unindex_window(window)
+        cells = self.cells(rect)
+        for cell in cells:
+            self.grid.setdefault(cell,set()).add(window)
+        self.indexed[window] = (rect,cells)
+        return True
+
+    def unindex_window(self,window):
+        rect,cells = self.indexed.pop(window,(None,[]))
+        for cell in cells:
+            self.grid[cell].discard(window)
+            if not self.grid[cell]:
+                del self.grid[cell]
+
+    def window_at(self,pos):
+        """Return the top-most window containing pos, or None."""
+        cell = (pos[0]//self.cell_size,pos[1]//self.cell_size)
+        hits = [window for window in self.grid.get(cell,())
+                if window.subrect.rel2display().collidepoint(pos)]
+        if hits:
+            return max(hits,key=self.z_order.get)
+
+    def find_visible(self):
+        """Return the windows (bottom to top) that aren't completely covered
+        by the opaque areas of windows above them."""
+        visible = []
+        occluders = []
+        for window in reversed(self.windows):
+            if not covered(window.subrect.rel2display(),occluders):
+                visible.append(window)
+            if hasattr(window,"opaque_rect"):
+                occluders.append(window.opaque_rect())
+        return visible[::-1]
+
+    def update(self,surface):
+        """Update the visible windows and return a list of changed screen
+        rects.  A window uncovered during the update (by a window being
+        dragged away) is updated as well."""
+        rects,self.damage = self.damage,[]
+        if self.restacked:
+            self.visible = self.find_visible()
+        updated = set(self.visible)
+        for window in self.visible:
+            rects.extend(window.update(surface) or [])
+            if self.index_window(window):
+                self.restacked = True
+        if self.restacked:
+            self.visible = self.find_visible()
+            self.restacked = False
+            for window in self.visible:
+                if window not in updated:
+                    rects.extend(window.update(surface) or [])
+        return rects
+
+    def draw(self,surface):
+        """Blit the current images of the visible windows."""
+        for window in self.visible:
+            window.draw(surface)
+
+    def get_events(self,event):
+        """Pass an event to the window it concerns.  Mouse events go to the
+        top-most window under the mouse (or the window that received the
+        last button press while the button is held); other events go to the
+        top window.  Clicking a window raises it.  When the mouse moves off a
+        window, that window gets the motion event as well so it can drop its
+        hover state.  Windows only get the event types they handle."""
+        if event.type in MOUSE_EVENTS:
+            if event.type == pg.MOUSEBUTTONDOWN:
+                target = self.window_at(event.pos)
+                if target and event.button == 1:
+                    self.raise_window(target)
+                    self.captured = target
+            elif event.type == pg.MOUSEBUTTONUP:
+                target = self.captured or self.window_at(event.pos)
+                self.captured = None
+            else:
+                target = self.captured or self.window_at(event.pos)
+                left = self.hovered
+                self.hovered = target
+                if left not in (None,target) and accepts(left,event):
+                    left.get_events(event)
+        else:
+            target = self.windows[-1] if self.windows else None
+        if target and accepts(target,event):
+            return target.get_events(event)